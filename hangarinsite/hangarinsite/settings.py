@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 import socket
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -63,6 +64,12 @@ AUTHENTICATION_BACKENDS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'todohan.middleware.StaticFilesMiddleware',
+    'todohan.middleware.MetricsMiddleware',
+    'todohan.middleware.SlowQueryMiddleware',
+    'todohan.middleware.QueryBudgetMiddleware',
+    'todohan.middleware.ReplicaRoutingMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -95,13 +102,75 @@ WSGI_APPLICATION = 'hangarinsite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Production SQLite profile: connections are kept for 10 minutes and checked
+# before reuse, and writes take the lock up front (BEGIN IMMEDIATE) so they
+# wait on busy_timeout instead of failing with "database is locked".
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Read replicas for the todohan list views and dashboard (see todohan.routers).
+# Point TODOHAN_REPLICA_DB at a copy of the database kept current by replication,
+# or at a second local SQLite file when testing.
+if os.environ.get('TODOHAN_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['TODOHAN_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+TODOHAN_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+# After a write the client reads from the primary for this many seconds; keep it above replica lag
+TODOHAN_REPLICA_STICKY_SECONDS = 5
+
+DATABASE_ROUTERS = ['todohan.routers.PrimaryReplicaRouter']
+
+# Applied to every new SQLite connection by todohan.db.apply_sqlite_pragmas.
+# WAL lets readers carry on while a form submission writes; /health/db/ reports the live values.
+TODOHAN_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',  # safe with WAL; only the last commits can be lost on power failure
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # negative means KiB, so ~64 MB of page cache
+    'busy_timeout': 5000,  # ms
+    'temp_store': 'memory',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Cached pages, the dashboard snapshot and the lookup tables are invalidated by
+# counters kept in this cache (see todohan.caching and todohan.lookups), so it
+# must be shared by every worker and by management commands. A process-local
+# backend such as LocMemCache would keep serving pages another process changed.
+# The default is a directory shared by every process on this host; set
+# TODOHAN_REDIS_URL when the workers run on several hosts.
+
+if os.environ.get('TODOHAN_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['TODOHAN_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('TODOHAN_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'hangarin-cache')),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -144,6 +213,22 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# Production static pipeline: collectstatic writes content-hashed copies with
+# .gz/.br variants (brotli needs the Brotli package), and StaticFilesMiddleware
+# serves them with far-future Cache-Control. DEBUG keeps plain names so
+# runserver works without collectstatic.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'todohan.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -193,4 +278,40 @@ PWA_APP_ICONS_APPLE = [
     }
 ]
 PWA_APP_DIR = 'ltr'
-PWA_SERVICE_WORKER_PATH = os.path.join(BASE_DIR, 'static/js', 'serviceworker.js')
\ No newline at end of file
+# The service worker itself is rendered from templates/serviceworker.js by
+# todohan.views.ServiceWorkerView; these assets are precached on install.
+TODOHAN_PRECACHE_ASSETS = [
+    'css/bootstrap.min.css',
+    'css/plugins.min.css',
+    'css/kaiadmin.min.css',
+    'css/fonts.min.css',
+    'js/plugin/webfont/webfont.min.js',
+    'js/core/jquery-3.7.1.min.js',
+    'js/core/popper.min.js',
+    'js/core/bootstrap.min.js',
+    'js/plugin/jquery-scrollbar/jquery.scrollbar.min.js',
+    'js/kaiadmin.min.js',
+    'img/kaiadmin/logo_light.svg',
+    'img/profile.jpg',
+    'img/Von_icon.ico',
+]
+
+# Todohan list views paginate with keyset cursors; "offset" restores numbered pages
+TODOHAN_PAGINATION_MODE = 'cursor'
+
+# Maximum number of create/update/delete items accepted by one /api/*/batch/ request
+TODOHAN_API_MAX_BATCH = 500
+
+# Per-view latency, SQL and template timings served at /metrics (see todohan.metrics),
+# to staff users and to scrapers sending "Authorization: Bearer <TODOHAN_METRICS_TOKEN>".
+# TODOHAN_METRICS_PUBLIC = True serves them to anyone, e.g. behind a private network.
+TODOHAN_METRICS = True
+TODOHAN_METRICS_TOKEN = os.environ.get('TODOHAN_METRICS_TOKEN')
+TODOHAN_METRICS_PUBLIC = False
+
+# Queries slower than this many milliseconds are kept with their EXPLAIN QUERY PLAN
+# and listed at /admin/slow-queries/ (see todohan.slowqueries)
+TODOHAN_SLOW_QUERY_MS = 100
+TODOHAN_SLOW_QUERY_LOG_SIZE = 200
+# Also save them to the todohan_slowquery table, so the page shows every process's queries
+TODOHAN_SLOW_QUERY_TABLE = False
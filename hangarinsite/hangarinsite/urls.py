@@ -18,15 +18,21 @@ from django.contrib import admin
 from django.urls import path, include
 from todohan.views import HomePageView, TaskListView, TaskCreateView, TaskUpdateView, TaskDeleteView
 from todohan.views import NoteListView, NoteCreateView, NoteUpdateView, NoteDeleteView, SubTaskListView, SubTaskCreateView, SubTaskUpdateView, SubTaskDeleteView, PriorityListView, PriorityCreateView, PriorityUpdateView, PriorityDeleteView, CategoryListView, CategoryCreateView, CategoryUpdateView, CategoryDeleteView
-from todohan import views
+from todohan import views, api, async_views
 
 urlpatterns = [
+    path("admin/slow-queries/", admin.site.admin_view(views.SlowQueryView.as_view()), name="slow-queries"),
     path("admin/", admin.site.urls),
+    # Replaces django-pwa's static service worker; must come before pwa.urls
+    path('serviceworker.js', views.ServiceWorkerView.as_view(), name='serviceworker'),
     path('', include('pwa.urls')),
     path("accounts/", include("allauth.urls")), # allauth routes
     path('', views.HomePageView.as_view(), name='home'),
     path('task_list', TaskListView.as_view(), name='task-list'),
     path('task_list/add', TaskCreateView.as_view(), name='task-add'),
+    path('task_list/bulk', views.TaskBulkActionView.as_view(), name='task-bulk'),
+    path('task_list/archive', views.ArchivedTaskListView.as_view(), name='task-archive'),
+    path('task_list/export.<str:format>', views.TaskExportView.as_view(), name='task-export'),
     path('task_list/<pk>',TaskUpdateView.as_view(), name='task-update'),
     path('task_list/<pk>/delete', TaskDeleteView.as_view(), name='task-delete'),
     path('notes/', NoteListView.as_view(), name='note-list'),
@@ -35,6 +41,7 @@ urlpatterns = [
     path('notes/<int:pk>/delete/', NoteDeleteView.as_view(), name='note-delete'),
     path('subtasks/', SubTaskListView.as_view(), name='subtask-list'),
     path('subtasks/add/', SubTaskCreateView.as_view(), name='subtask-add'),
+    path('subtasks/bulk/', views.SubTaskBulkActionView.as_view(), name='subtask-bulk'),
     path('subtasks/<int:pk>/edit/', SubTaskUpdateView.as_view(), name='subtask-edit'),
     path('subtasks/<int:pk>/delete/', SubTaskDeleteView.as_view(), name='subtask-delete'),
     path('priorities/', views.PriorityListView.as_view(), name='priority-list'),
@@ -45,4 +52,37 @@ urlpatterns = [
     path('categories/add/', views.CategoryCreateView.as_view(), name='category-add'),
     path('categories/<int:pk>/edit/', views.CategoryUpdateView.as_view(), name='category-edit'),
     path('categories/<int:pk>/delete/', views.CategoryDeleteView.as_view(), name='category-delete'),
+    path('cache-stats/', views.PageCacheStatsView.as_view(), name='cache-stats'),
+    path('health/db/', views.DatabaseHealthView.as_view(), name='health-db'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+    path('api/tasks/', api.TaskListAPIView.as_view(), name='api-task-list'),
+    path('api/tasks/batch/', api.TaskBatchAPIView.as_view(), name='api-task-batch'),
+    path('api/tasks/import/', api.TaskImportAPIView.as_view(), name='api-task-import'),
+    path('api/notes/', api.NoteListAPIView.as_view(), name='api-note-list'),
+    path('api/notes/batch/', api.NoteBatchAPIView.as_view(), name='api-note-batch'),
+    path('api/subtasks/', api.SubTaskListAPIView.as_view(), name='api-subtask-list'),
+    path('api/subtasks/batch/', api.SubTaskBatchAPIView.as_view(), name='api-subtask-batch'),
+    path('api/sync/', api.SyncAPIView.as_view(), name='api-sync'),
+    # Async views for the ASGI deployment
+    path('async/', async_views.AsyncHomePageView.as_view(), name='async-home'),
+    path('async/task_list', async_views.AsyncTaskListView.as_view(), name='async-task-list'),
+    path('async/task_list/add', async_views.AsyncTaskCreateView.as_view(), name='async-task-add'),
+    path('async/task_list/<pk>', async_views.AsyncTaskUpdateView.as_view(), name='async-task-update'),
+    path('async/task_list/<pk>/delete', async_views.AsyncTaskDeleteView.as_view(), name='async-task-delete'),
+    path('async/notes/', async_views.AsyncNoteListView.as_view(), name='async-note-list'),
+    path('async/notes/add/', async_views.AsyncNoteCreateView.as_view(), name='async-note-add'),
+    path('async/notes/<int:pk>/edit/', async_views.AsyncNoteUpdateView.as_view(), name='async-note-edit'),
+    path('async/notes/<int:pk>/delete/', async_views.AsyncNoteDeleteView.as_view(), name='async-note-delete'),
+    path('async/subtasks/', async_views.AsyncSubTaskListView.as_view(), name='async-subtask-list'),
+    path('async/subtasks/add/', async_views.AsyncSubTaskCreateView.as_view(), name='async-subtask-add'),
+    path('async/subtasks/<int:pk>/edit/', async_views.AsyncSubTaskUpdateView.as_view(), name='async-subtask-edit'),
+    path('async/subtasks/<int:pk>/delete/', async_views.AsyncSubTaskDeleteView.as_view(), name='async-subtask-delete'),
+    path('async/priorities/', async_views.AsyncPriorityListView.as_view(), name='async-priority-list'),
+    path('async/priorities/add/', async_views.AsyncPriorityCreateView.as_view(), name='async-priority-add'),
+    path('async/priorities/<int:pk>/edit/', async_views.AsyncPriorityUpdateView.as_view(), name='async-priority-edit'),
+    path('async/priorities/<int:pk>/delete/', async_views.AsyncPriorityDeleteView.as_view(), name='async-priority-delete'),
+    path('async/categories/', async_views.AsyncCategoryListView.as_view(), name='async-category-list'),
+    path('async/categories/add/', async_views.AsyncCategoryCreateView.as_view(), name='async-category-add'),
+    path('async/categories/<int:pk>/edit/', async_views.AsyncCategoryUpdateView.as_view(), name='async-category-edit'),
+    path('async/categories/<int:pk>/delete/', async_views.AsyncCategoryDeleteView.as_view(), name='async-category-delete'),
 ]
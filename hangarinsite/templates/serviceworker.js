@@ -0,0 +1,193 @@
+// Rendered by todohan.views.ServiceWorkerView.
+//
+// - Hashed static assets: precached on install, then cache-first.
+// - HTML pages: stale-while-revalidate. Any form submission drops the cached
+//   pages so the redirect that follows shows the change.
+// - Tasks, notes and subtasks: kept in IndexedDB and updated from the sync
+//   endpoint, which only returns rows changed since the last sync token.
+
+const VERSION = '{{ version }}';
+const STATIC_CACHE = 'hangarin-static-' + VERSION;
+const PAGES_CACHE = 'hangarin-pages';
+const PRECACHE = {{ precache|safe }};
+const STATIC_URL = '{{ static_url }}';
+const OFFLINE_URL = '{{ offline_url }}';
+const SYNC_URL = '{{ sync_url }}';
+const SYNC_INTERVAL = 60 * 1000;
+
+const DATABASE = 'hangarin';
+const STORES = ['tasks', 'notes', 'subtasks'];
+
+// Never cached: sign-in, the admin and the JSON API
+const NETWORK_ONLY = ['/accounts/', '/admin/', '/api/'];
+
+let lastSync = 0;
+
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(STATIC_CACHE)
+            .then(cache => cache.addAll(PRECACHE))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    // Drop the previous release's assets and anything left by older workers
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(
+                keys.filter(key => key !== STATIC_CACHE && key !== PAGES_CACHE).map(key => caches.delete(key))
+            ))
+            .then(() => self.clients.claim())
+            .then(() => maybeSync())
+    );
+});
+
+self.addEventListener('message', event => {
+    if (event.data === 'sync') {
+        lastSync = 0;
+        event.waitUntil(maybeSync());
+    }
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+
+    if (request.method !== 'GET') {
+        event.respondWith(fetch(request).then(response => caches.delete(PAGES_CACHE).then(() => response)));
+        return;
+    }
+    if (NETWORK_ONLY.some(prefix => url.pathname.startsWith(prefix))) {
+        if (url.pathname.startsWith('/accounts/')) {
+            // Signing in or out may switch users on this device
+            event.waitUntil(clearUserData());
+        }
+        return;
+    }
+    if (url.pathname.startsWith(STATIC_URL)) {
+        event.respondWith(cacheFirst(request));
+        return;
+    }
+    if (request.mode === 'navigate' || (request.headers.get('Accept') || '').includes('text/html')) {
+        event.respondWith(staleWhileRevalidate(event));
+        event.waitUntil(maybeSync());
+    }
+});
+
+
+function cacheFirst(request) {
+    return caches.match(request).then(cached => cached || fetch(request).then(response => {
+        if (response.ok) {
+            const copy = response.clone();
+            caches.open(STATIC_CACHE).then(cache => cache.put(request, copy));
+        }
+        return response;
+    }));
+}
+
+function staleWhileRevalidate(event) {
+    const request = event.request;
+    return caches.open(PAGES_CACHE).then(cache => cache.match(request).then(cached => {
+        const network = fetch(request).then(response => {
+            // Redirects to the login form are not pages worth keeping
+            if (response.ok && !response.redirected) {
+                cache.put(request, response.clone());
+            }
+            return response;
+        });
+        if (cached) {
+            event.waitUntil(network.catch(() => undefined));
+            return cached;
+        }
+        return network.catch(() => caches.match(OFFLINE_URL));
+    }));
+}
+
+
+function openDatabase() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open(DATABASE, 1);
+        open.onupgradeneeded = () => {
+            STORES.forEach(name => open.result.createObjectStore(name, { keyPath: 'id' }));
+            open.result.createObjectStore('meta');
+        };
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+function result(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function done(transaction) {
+    return new Promise((resolve, reject) => {
+        transaction.oncomplete = () => resolve();
+        transaction.onerror = transaction.onabort = () => reject(transaction.error);
+    });
+}
+
+function maybeSync() {
+    if (Date.now() - lastSync < SYNC_INTERVAL) {
+        return Promise.resolve();
+    }
+    lastSync = Date.now();
+    return sync().catch(() => undefined);
+}
+
+async function sync(full = false) {
+    const db = await openDatabase();
+    let token = full ? undefined : await result(db.transaction('meta').objectStore('meta').get('token'));
+    let data = { more: true };
+
+    while (data.more) {
+        const response = await fetch(token ? `${SYNC_URL}?since=${encodeURIComponent(token)}` : SYNC_URL, {
+            credentials: 'same-origin',
+        });
+        if (!response.ok) {
+            // Signed out, or a token from an older deployment: start again next time
+            if (response.status === 400) {
+                await clearUserData();
+            }
+            return;
+        }
+        data = await response.json();
+
+        const transaction = db.transaction([...STORES, 'meta'], 'readwrite');
+        STORES.forEach(name => {
+            const store = transaction.objectStore(name);
+            if (data.full && !token) {
+                store.clear();
+            }
+            data[name].forEach(row => row.deleted_at ? store.delete(row.id) : store.put(row));
+        });
+        transaction.objectStore('meta').put(data.token, 'token');
+        await done(transaction);
+        token = data.token;
+    }
+
+    // Deleted rows arrive with deleted_at set, unless they were purged before this
+    // client saw them; a count mismatch means some are gone
+    const transaction = db.transaction(STORES);
+    const counts = await Promise.all(STORES.map(name => result(transaction.objectStore(name).count())));
+    if (!full && STORES.some((name, i) => counts[i] !== data.counts[name])) {
+        await sync(true);
+    }
+}
+
+async function clearUserData() {
+    lastSync = 0;
+    await caches.delete(PAGES_CACHE);
+    const db = await openDatabase();
+    const transaction = db.transaction([...STORES, 'meta'], 'readwrite');
+    [...STORES, 'meta'].forEach(name => transaction.objectStore(name).clear());
+    await done(transaction);
+}
@@ -1,53 +1,216 @@
+import hashlib
+
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 
 # Register your models here.
-from .models import Priority, Category, Task, Note, SubTask
+from .models import Priority, Category, Task, Note, SubTask, ArchivedTask, ArchivedNote, ArchivedSubTask, SlowQuery
+from .search import search, fts_columns, fts_enabled
+from .bulk import delete as soft_delete
+from .lookups import LOOKUP_MODELS, LookupChoiceField, attach_lookups, get_lookup
+
+ADMIN_COUNT_TIMEOUT = 60 * 5
+INLINE_ROWS = 20
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator that caches COUNT(*) per query for a few minutes.
+
+    Page links may be slightly off right after rows are added or removed, in
+    exchange for not counting millions of rows on every changelist view.
+    """
+
+    @cached_property
+    def count(self):
+        key = "todohan:admin-count:" + hashlib.md5(str(self.object_list.query).encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, ADMIN_COUNT_TIMEOUT)
+        return count
+
+
+class SoftDeleteAdmin(admin.ModelAdmin):
+    # Deletes mark rows (and what they own) instead of cascading through the collector
+    def delete_model(self, request, obj):
+        soft_delete(type(obj), [obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        soft_delete(queryset.model, queryset.values_list("pk", flat=True))
+
+
+class ScalableAdmin(SoftDeleteAdmin):
+    paginator = CachedCountPaginator
+    # Skip the second, unfiltered COUNT(*) the changelist runs for "x of y selected"
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the FTS5 index instead of icontains scans where it covers the search fields
+        fields = [field.lstrip("^=@") for field in self.get_search_fields(request)]
+        if search_term and fts_columns(queryset.model, fields) and fts_enabled(queryset.model, queryset.db):
+            return search(queryset, search_term, fields), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+class LookupListFilter(admin.RelatedFieldListFilter):
+    # Filter choices for Category/Priority without querying them
+    def field_choices(self, field, request, model_admin):
+        return [(obj.pk, str(obj)) for obj in get_lookup(field.related_model).objects]
+
+
+class LookupChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # Evaluates result_list in place, so the template reuses these rows
+        attach_lookups(self.result_list, *self.model_admin.lookup_related)
+
+
+class LookupAdminMixin:
+    """Serve Category/Priority foreign keys from the lookup cache in forms and the changelist."""
+    lookup_related = ()
+
+    def get_changelist(self, request, **kwargs):
+        return LookupChangeList
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.related_model in LOOKUP_MODELS:
+            kwargs.setdefault("form_class", LookupChoiceField)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class LimitedInlineFormSet(BaseInlineFormSet):
+    def delete_existing(self, obj, commit=True):
+        if commit:
+            soft_delete(type(obj), [obj.pk])
+
+    # Only the most recent rows are editable inline; the rest open in their changelist
+    def get_queryset(self):
+        if not hasattr(self, "_queryset"):
+            self._queryset = super().get_queryset()[:INLINE_ROWS]
+        return self._queryset
 
 
 class SubTaskInline(admin.TabularInline):
     model = SubTask
+    formset = LimitedInlineFormSet
     extra = 1
     fields = ("title", "status")
+    ordering = ("-created_at",)
     show_change_link = True
 
 class NoteInline(admin.StackedInline):
     model = Note
+    formset = LimitedInlineFormSet
     extra = 1
     fields = ("content", "created_at")
     readonly_fields = ("created_at",)
+    ordering = ("-created_at",)
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(LookupAdminMixin, ScalableAdmin):
     list_display = ('title', 'status', 'deadline', 'priority', 'category')
-    list_filter = ('status', 'priority', 'category')
+    list_filter = ('status', ('priority', LookupListFilter), ('category', LookupListFilter))
+    # An empty tuple rather than False, which would join every related column in list_display
+    list_select_related = ()
+    lookup_related = ('priority', 'category')
     search_fields = ('title', 'description')
+    ordering = ('-pk',)
+    readonly_fields = ('all_subtasks', 'all_notes')
 
     inlines = [SubTaskInline, NoteInline]
 
+    def related_link(self, obj, model, field, count):
+        if obj.pk is None:
+            return "-"
+        opts = model._meta
+        url = reverse(f"admin:{opts.app_label}_{opts.model_name}_changelist")
+        return format_html('<a href="{}?{}={}">View all {} {}</a>', url, field, obj.pk, count, opts.verbose_name_plural)
+
+    # The counts come from the task's counters, not a COUNT per link
+    @admin.display(description="Subtasks")
+    def all_subtasks(self, obj):
+        return self.related_link(obj, SubTask, "parent_task__id__exact", obj.subtask_count)
+
+    @admin.display(description="Notes")
+    def all_notes(self, obj):
+        return self.related_link(obj, Note, "task__id__exact", obj.note_count)
+
 @admin.register(SubTask)
-class SubTaskAdmin(admin.ModelAdmin):
+class SubTaskAdmin(ScalableAdmin):
     list_display = ('title', 'status', 'parent_task_name')
     list_filter = ('status',)
+    list_select_related = ('parent_task',)
     search_fields = ('title',)
+    autocomplete_fields = ('parent_task',)
 
+    @admin.display(description="Parent task", ordering="parent_task__title")
     def parent_task_name(self, obj):
-        try:
-            task = Task.objects.get(id=obj.parent_task_id)
-            return task.title
-        except Task.DoesNotExist:
-            return None
+        return obj.parent_task.title
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(SoftDeleteAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
 @admin.register(Priority)
-class PriorityAdmin(admin.ModelAdmin):
+class PriorityAdmin(SoftDeleteAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
 @admin.register(Note)
-class NoteAdmin(admin.ModelAdmin):
+class NoteAdmin(ScalableAdmin):
     list_display = ('task', 'content', 'created_at')
+    list_select_related = ('task',)
     search_fields = ('content',)
+    autocomplete_fields = ('task',)
+
+
+class ReadOnlyMixin:
+    # Archived rows are a record of what was; archive_completed is the only writer
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+class ArchiveAdmin(ReadOnlyMixin, admin.ModelAdmin):
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
+class ArchivedSubTaskInline(ReadOnlyMixin, admin.TabularInline):
+    model = ArchivedSubTask
+    fields = ("title", "status", "created_at")
+    ordering = ("created_at",)
+
+class ArchivedNoteInline(ReadOnlyMixin, admin.StackedInline):
+    model = ArchivedNote
+    fields = ("content", "created_at")
+    ordering = ("created_at",)
+
+@admin.register(ArchivedTask)
+class ArchivedTaskAdmin(LookupAdminMixin, ArchiveAdmin):
+    list_display = ('title', 'original_id', 'deadline', 'priority', 'category', 'archived_at')
+    list_filter = (('priority', LookupListFilter), ('category', LookupListFilter))
+    list_select_related = ()
+    lookup_related = ('priority', 'category')
+    search_fields = ('title', 'description')
+    ordering = ('-pk',)
+    inlines = [ArchivedSubTaskInline, ArchivedNoteInline]
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(ReadOnlyMixin, admin.ModelAdmin):
+    # Rows only exist with TODOHAN_SLOW_QUERY_TABLE on; /admin/slow-queries/ groups them
+    list_display = ('recorded_at', 'view', 'duration', 'sql')
+    list_filter = ('view',)
+    search_fields = ('sql',)
+    ordering = ('-pk',)
+
@@ -0,0 +1,307 @@
+import codecs
+import datetime
+import json
+import os
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.generic import View
+from todohan import bulk
+from todohan.models import Task, Note, SubTask
+from todohan.caching import bump_generation
+from todohan.counters import recount_parents
+from todohan.importer import IMPORT_FORMATS, import_tasks
+from todohan.pagination import keyset_filter
+from todohan.views import TaskListView, NoteListView, SubTaskListView
+
+MAX_PAGE_SIZE = 100
+
+SYNC_MODELS = {"tasks": Task, "notes": Note, "subtasks": SubTask}
+SYNC_SALT = "todohan.api.sync"
+SYNC_BATCH = 500
+# Position before every row, for tables a full sync found empty
+SYNC_START = (datetime.datetime.min.replace(tzinfo=datetime.timezone.utc), 0)
+
+
+def serialize(obj):
+    data = {field.name: field.value_from_object(obj) for field in obj._meta.concrete_fields}
+    if hasattr(obj, "search_rank"):
+        data["search_rank"] = obj.search_rank
+    return data
+
+
+class APILoginRequiredMixin(LoginRequiredMixin):
+    def handle_no_permission(self):
+        return JsonResponse({"error": "Authentication required."}, status=401)
+
+
+class JSONListMixin(APILoginRequiredMixin):
+    """Render a todohan ListView as JSON, keeping its search, sort and cursor pagination."""
+    paginate_by = 50
+
+    def get_paginate_by(self, queryset):
+        try:
+            size = int(self.request.GET.get("page_size", self.paginate_by))
+        except ValueError:
+            size = self.paginate_by
+        return min(max(size, 1), MAX_PAGE_SIZE)
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context["page_obj"]
+        return JsonResponse({
+            "results": [serialize(obj) for obj in context["object_list"]],
+            "next": getattr(page, "next_cursor", None),
+            "previous": getattr(page, "previous_cursor", None),
+        })
+
+
+class TaskListAPIView(JSONListMixin, TaskListView):
+    pass
+
+
+class NoteListAPIView(JSONListMixin, NoteListView):
+    pass
+
+
+class SubTaskListAPIView(JSONListMixin, SubTaskListView):
+    pass
+
+
+class BatchAPIView(APILoginRequiredMixin, View):
+    """Create, update and delete many objects in one request and one transaction.
+
+    The body is ``{"create": [{...}], "update": [{"id": 1, ...}], "delete": [1, 2]}``.
+    Every item is validated before anything is written; if any item fails the
+    whole batch is rejected with per-item errors.
+    """
+    model = None
+    fields = ()
+    http_method_names = ["post"]
+
+    def get_max_batch_size(self):
+        return getattr(settings, "TODOHAN_API_MAX_BATCH", 500)
+
+    def foreign_keys(self):
+        return [
+            field for field in (self.model._meta.get_field(name) for name in self.fields)
+            if isinstance(field, models.ForeignKey)
+        ]
+
+    def load_foreign_keys(self, items):
+        # One query per related model instead of one per item
+        valid = {}
+        for field in self.foreign_keys():
+            ids = {item[field.name] for item in items if isinstance(item.get(field.name), int)}
+            valid[field.name] = set(field.related_model.objects.filter(pk__in=ids).values_list("pk", flat=True))
+        return valid
+
+    def assign(self, obj, item):
+        for name, value in item.items():
+            if name == "id":
+                continue
+            if name not in self.fields:
+                raise ValidationError({name: ["Unknown field."]})
+            field = self.model._meta.get_field(name)
+            setattr(obj, field.attname, value)
+
+    def clean(self, obj, item, valid_fks, creating):
+        errors = {}
+        try:
+            self.assign(obj, item)
+            fk_names = [field.name for field in self.foreign_keys()]
+            obj.full_clean(exclude=fk_names, validate_unique=False, validate_constraints=False)
+        except ValidationError as e:
+            errors.update(e.message_dict)
+
+        for field in self.foreign_keys():
+            if field.name not in item and not creating:
+                continue
+            if item.get(field.name) is None:
+                errors[field.name] = ["This field is required."]
+            elif item[field.name] not in valid_fks[field.name]:
+                errors[field.name] = ["Select a valid choice."]
+
+        for field in obj._meta.concrete_fields:
+            value = getattr(obj, field.attname)
+            if isinstance(field, models.DateTimeField) and value and timezone.is_naive(value):
+                setattr(obj, field.attname, timezone.make_aware(value))
+        return errors
+
+    def error(self, message, status=400):
+        return JsonResponse({"error": message}, status=status)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return self.error("Request body must be JSON.")
+        if not isinstance(payload, dict):
+            return self.error("Request body must be a JSON object.")
+
+        create = payload.get("create", [])
+        update = payload.get("update", [])
+        delete = payload.get("delete", [])
+        if not all(isinstance(items, list) for items in (create, update, delete)):
+            return self.error('"create", "update" and "delete" must be lists.')
+        if not all(isinstance(item, dict) for item in create + update):
+            return self.error('"create" and "update" items must be objects.')
+        if not all(isinstance(pk, int) for pk in delete):
+            return self.error('"delete" must be a list of ids.')
+        if len(create) + len(update) + len(delete) > self.get_max_batch_size():
+            return self.error(f"At most {self.get_max_batch_size()} items per batch.")
+
+        results = {"create": [], "update": [], "delete": []}
+        failed = False
+
+        # Validation reads and updated_at happen under the write lock taken at
+        # BEGIN IMMEDIATE, so no other writer commits a later timestamp first
+        # (which /api/sync/ would move past) or changes the rows read here
+        with transaction.atomic():
+            valid_fks = self.load_foreign_keys(create + update)
+            existing = self.model.objects.in_bulk(
+                [item.get("id") for item in update if isinstance(item.get("id"), int)]
+            )
+
+            to_create = []
+            for index, item in enumerate(create):
+                obj = self.model()
+                errors = self.clean(obj, item, valid_fks, creating=True)
+                results["create"].append({"index": index, "ok": not errors, **({"errors": errors} if errors else {})})
+                failed = failed or bool(errors)
+                to_create.append(obj)
+
+            to_update, update_fields = [], {"updated_at"}
+            now = timezone.now()
+            for index, item in enumerate(update):
+                obj = existing.get(item.get("id"))
+                if obj is None:
+                    errors = {"id": ["Not found."]}
+                else:
+                    errors = self.clean(obj, item, valid_fks, creating=False)
+                    obj.updated_at = now
+                    to_update.append(obj)
+                    update_fields.update(name for name in item if name != "id")
+                results["update"].append({"index": index, "id": item.get("id"), "ok": not errors,
+                                          **({"errors": errors} if errors else {})})
+                failed = failed or bool(errors)
+
+            if failed:
+                return JsonResponse(results, status=400)
+
+            created = self.model.objects.bulk_create(to_create)
+            if to_update:
+                self.model.objects.bulk_update(to_update, sorted(update_fields))
+            deletable = set(self.model.objects.filter(pk__in=delete).values_list("pk", flat=True))
+            if deletable:
+                bulk.delete(self.model, deletable)
+            # bulk.delete repairs the counters it touches; bulk_create/bulk_update don't
+            recount_parents(self.model, created + to_update)
+
+        for result, obj in zip(results["create"], created):
+            result["id"] = obj.pk
+        results["delete"] = [{"id": pk, "ok": pk in deletable} for pk in delete]
+
+        # bulk_create/bulk_update send no signals
+        bump_generation(self.model)
+        return JsonResponse(results)
+
+
+class TaskBatchAPIView(BatchAPIView):
+    model = Task
+    fields = ("title", "description", "deadline", "status", "category", "priority")
+
+
+class NoteBatchAPIView(BatchAPIView):
+    model = Note
+    fields = ("task", "content")
+
+
+class SubTaskBatchAPIView(BatchAPIView):
+    model = SubTask
+    fields = ("parent_task", "title", "status")
+
+
+class SyncAPIView(APILoginRequiredMixin, View):
+    """Rows changed since the client's last sync, for the offline copy kept by the service worker.
+
+    Without ``since`` everything is sent (``"full": true``). Each response
+    carries the ``token`` to send next time, the (updated_at, id) of the last
+    row sent per table; ``"more": true`` means call again straight away. Deltas include soft-deleted rows, with ``deleted_at`` set,
+    so the client can drop them. ``counts`` lets the client notice rows that
+    were purged before it saw them deleted, and fall back to a full sync.
+    """
+    http_method_names = ["get"]
+    query_budget = 8
+
+    def decode_token(self, token):
+        try:
+            data = signing.loads(token, salt=SYNC_SALT)
+            return {
+                name: (datetime.datetime.fromisoformat(data[name][0]), data[name][1])
+                for name in SYNC_MODELS
+            }
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None
+
+    def get(self, request, *args, **kwargs):
+        since = self.decode_token(request.GET["since"]) if "since" in request.GET else None
+        if "since" in request.GET and since is None:
+            return JsonResponse({"error": "Invalid sync token."}, status=400)
+
+        data, positions, more = {}, {}, False
+        for name, model in SYNC_MODELS.items():
+            queryset = model.objects.order_by("updated_at", "id")
+            if since:
+                queryset = model.all_objects.order_by("updated_at", "id").filter(
+                    keyset_filter(["updated_at", "id"], list(since[name]))
+                )
+            rows = list(queryset[:SYNC_BATCH + 1])
+            if len(rows) > SYNC_BATCH:
+                rows = rows[:SYNC_BATCH]
+                more = True
+            # Resume after the last row sent
+            if rows:
+                positions[name] = (rows[-1].updated_at, rows[-1].pk)
+            else:
+                positions[name] = since[name] if since else SYNC_START
+            data[name] = [serialize(obj) for obj in rows]
+
+        token = signing.dumps(
+            {name: [value.isoformat(), pk] for name, (value, pk) in positions.items()}, salt=SYNC_SALT,
+        )
+        return JsonResponse({
+            "full": since is None,
+            "more": more,
+            "token": token,
+            "counts": None if more else {name: model.objects.count() for name, model in SYNC_MODELS.items()},
+            **data,
+        })
+
+
+class TaskImportAPIView(APILoginRequiredMixin, View):
+    """Import an uploaded export file (multipart field ``file``).
+
+    Pass the same ``job`` key again to resume an import that stopped part
+    way; without one every upload is a new job.
+    """
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return JsonResponse({"error": 'Upload the export as "file".'}, status=400)
+        format = request.POST.get("format") or IMPORT_FORMATS.get(os.path.splitext(upload.name)[1].lower())
+        if format not in IMPORT_FORMATS.values():
+            return JsonResponse({"error": '"format" must be "csv" or "ndjson".'}, status=400)
+        key = request.POST.get("job") or f"upload:{uuid.uuid4()}"
+        try:
+            importer = import_tasks(codecs.iterdecode(upload, "utf-8"), format, f"{request.user.pk}:{key}")
+        except UnicodeDecodeError:
+            return JsonResponse({"error": "The file must be UTF-8."}, status=400)
+        return JsonResponse({**importer.report(), "job": key})
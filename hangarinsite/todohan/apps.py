@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TodohanConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'todohan'
+
+    def ready(self):
+        from todohan import signals  # noqa: F401
@@ -0,0 +1,70 @@
+"""Moving completed tasks out of the hot tables.
+
+``archive_completed`` copies completed tasks, with their notes and subtasks,
+into the Archived* tables and removes them from the live ones, a bounded
+chunk per transaction, so the tables the list views, dashboard and admin
+scan only hold what is still in use. Archived rows are read back through
+the archive list and ``?archived=1`` on the export.
+"""
+from django.db import router, transaction
+
+from todohan.bulk import raw_delete
+from todohan.caching import bump_generation
+from todohan.counters import COMPLETED, RECOUNTERS
+from todohan.models import Priority, Category, Task, Note, SubTask, ArchivedTask, ArchivedNote, ArchivedSubTask
+
+# archive_completed moves at most this many tasks per transaction
+ARCHIVE_CHUNK = 500
+
+TASK_FIELDS = (
+    "title", "description", "deadline", "status", "category_id", "priority_id",
+    "subtask_count", "completed_subtask_count", "note_count", "created_at", "updated_at",
+)
+NOTE_FIELDS = ("content", "created_at", "updated_at")
+SUBTASK_FIELDS = ("title", "status", "created_at", "updated_at")
+
+
+def copy(model, obj, fields, **extra):
+    return model(**{name: getattr(obj, name) for name in fields}, **extra)
+
+
+def archive_chunk(tasks, using):
+    """Copy ``tasks`` and their live children into the archive, then delete them; return the copies."""
+    copies = ArchivedTask.objects.using(using).bulk_create(
+        [copy(ArchivedTask, task, TASK_FIELDS, original_id=task.pk) for task in tasks]
+    )
+    by_task = {task.pk: archived for task, archived in zip(tasks, copies)}
+    ArchivedNote.objects.using(using).bulk_create([
+        copy(ArchivedNote, note, NOTE_FIELDS, task=by_task[note.task_id])
+        for note in Note.objects.using(using).filter(task__in=by_task).order_by("id")
+    ])
+    ArchivedSubTask.objects.using(using).bulk_create([
+        copy(ArchivedSubTask, subtask, SUBTASK_FIELDS, parent_task=by_task[subtask.parent_task_id])
+        for subtask in SubTask.objects.using(using).filter(parent_task__in=by_task).order_by("id")
+    ])
+    # Soft-deleted children go too; purge_deleted would only have removed them later
+    raw_delete(Task.all_objects.using(using).filter(pk__in=by_task))
+    return copies
+
+
+def archive_completed(before, chunk_size=ARCHIVE_CHUNK, progress=None):
+    """Archive tasks Completed and last changed before ``before``; return how many were moved."""
+    using = router.db_for_write(Task)
+    archived = 0
+    while True:
+        with transaction.atomic(using=using):
+            tasks = list(
+                Task.objects.using(using).filter(status=COMPLETED, updated_at__lt=before)
+                .order_by("updated_at")[:chunk_size]
+            )
+            if not tasks:
+                return archived
+            archive_chunk(tasks, using)
+            # The tasks no longer count towards their category and priority
+            RECOUNTERS[Category]({task.category_id for task in tasks})
+            RECOUNTERS[Priority]({task.priority_id for task in tasks})
+        # Neither bulk_create nor _raw_delete sends signals
+        bump_generation(Task, Note, SubTask, ArchivedTask)
+        archived += len(tasks)
+        if progress:
+            progress(archived)
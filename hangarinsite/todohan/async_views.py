@@ -0,0 +1,193 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import HttpResponseRedirect
+from django.shortcuts import aget_object_or_404
+from django.urls import reverse_lazy
+from todohan import bulk
+from todohan.pagination import CURSOR_PARAM, apaginate_by_cursor
+from todohan.stats import aget_dashboard_stats
+from todohan.views import (
+    HomePageView, TaskListView, TaskCreateView, TaskUpdateView, TaskDeleteView,
+    NoteListView, NoteCreateView, NoteUpdateView, NoteDeleteView,
+    SubTaskListView, SubTaskCreateView, SubTaskUpdateView, SubTaskDeleteView,
+    CategoryListView, CategoryCreateView, CategoryUpdateView, CategoryDeleteView,
+    PriorityListView, PriorityCreateView, PriorityUpdateView, PriorityDeleteView,
+)
+
+# Async counterparts of todohan.views for the ASGI deployment. Each one reuses
+# the sync view's queryset, templates and forms; only the request handling and
+# database access are async. Templates still render in a worker thread.
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """LoginRequiredMixin that loads the user with the async session API."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        # Skip LoginRequiredMixin.dispatch, which would check the user again synchronously
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+
+
+class AsyncListMixin:
+    """Async GET for the todohan ListViews, keeping their page cache and ETags."""
+
+    async def get(self, request, *args, **kwargs):
+        key, response = await sync_to_async(self.get_cached_page)()
+        if response is not None:
+            return response
+
+        await self.load()
+        return self.cache_page(key, self.render_conditional(self.get_context_data()))
+
+    async def load(self):
+        # get_queryset may introspect the search tables, so it runs off the event loop
+        queryset = await sync_to_async(self.get_queryset)()
+        page_size = self.get_paginate_by(queryset)
+        if page_size:
+            self.page = await self.apaginate_queryset(queryset, page_size)
+            self.object_list = queryset
+            await self.aattach_lookups(self.page[2])
+        else:
+            self.object_list = [obj async for obj in queryset]
+            await self.aattach_lookups(self.object_list)
+
+    async def aattach_lookups(self, objs):
+        # Reloading the lookup cache queries the database; get_context_data then finds everything attached
+        if getattr(self, "lookup_related", ()):
+            await sync_to_async(self.attach_lookups)(objs)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        if self.get_pagination_mode() == "cursor":
+            page = await apaginate_by_cursor(queryset, page_size, self.request.GET.get(CURSOR_PARAM))
+            return (None, page, page.object_list, page.has_other_pages())
+
+        paginate = super().paginate_queryset
+
+        def offset_page():
+            paginator, page, object_list, is_paginated = paginate(queryset, page_size)
+            page.object_list = list(object_list)
+            return (paginator, page, page.object_list, is_paginated)
+
+        return await sync_to_async(offset_page)()
+
+    def paginate_queryset(self, queryset, page_size):
+        return self.page
+
+
+class AsyncEditMixin:
+    """Async GET/POST for the generic create, update and delete views."""
+    http_method_names = ["get", "post", "head", "options"]
+
+    async def aget_object(self):
+        if self.pk_url_kwarg not in self.kwargs:
+            return None
+        return await aget_object_or_404(self.get_queryset(), pk=self.kwargs[self.pk_url_kwarg])
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
+        return self.render_to_response(self.get_context_data())
+
+    async def post(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
+        form = self.get_form()
+        # ModelChoiceField validation queries the database
+        if await sync_to_async(form.is_valid)():
+            return await self.aform_valid(form)
+        return self.form_invalid(form)
+
+
+class AsyncFormMixin(AsyncEditMixin):
+
+    async def aform_valid(self, form):
+        # todohan forms have no many-to-many fields, so there is no save_m2m() to run
+        self.object = form.save(commit=False)
+        await self.object.asave()
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class AsyncDeleteMixin(AsyncEditMixin):
+
+    async def aform_valid(self, form):
+        success_url = self.get_success_url()
+        await sync_to_async(bulk.delete)(self.model, [self.object.pk])
+        return HttpResponseRedirect(success_url)
+
+
+class AsyncHomePageView(AsyncLoginRequiredMixin, AsyncListMixin, HomePageView):
+
+    async def load(self):
+        queryset = self.get_queryset()
+
+        async def recent_tasks():
+            return [task async for task in queryset]
+
+        self.stats, self.object_list = await asyncio.gather(aget_dashboard_stats(), recent_tasks())
+        await self.aattach_lookups(self.object_list)
+
+    def get_stats(self):
+        return self.stats
+
+
+class AsyncTaskListView(AsyncLoginRequiredMixin, AsyncListMixin, TaskListView):
+    pass
+
+class AsyncTaskCreateView(AsyncLoginRequiredMixin, AsyncFormMixin, TaskCreateView):
+    success_url = reverse_lazy('async-task-list')
+
+class AsyncTaskUpdateView(AsyncLoginRequiredMixin, AsyncFormMixin, TaskUpdateView):
+    success_url = reverse_lazy('async-task-list')
+
+class AsyncTaskDeleteView(AsyncLoginRequiredMixin, AsyncDeleteMixin, TaskDeleteView):
+    success_url = reverse_lazy('async-task-list')
+
+class AsyncNoteListView(AsyncLoginRequiredMixin, AsyncListMixin, NoteListView):
+    pass
+
+class AsyncNoteCreateView(AsyncLoginRequiredMixin, AsyncFormMixin, NoteCreateView):
+    success_url = reverse_lazy('async-note-list')
+
+class AsyncNoteUpdateView(AsyncLoginRequiredMixin, AsyncFormMixin, NoteUpdateView):
+    success_url = reverse_lazy('async-note-list')
+
+class AsyncNoteDeleteView(AsyncLoginRequiredMixin, AsyncDeleteMixin, NoteDeleteView):
+    success_url = reverse_lazy('async-note-list')
+
+class AsyncSubTaskListView(AsyncLoginRequiredMixin, AsyncListMixin, SubTaskListView):
+    pass
+
+class AsyncSubTaskCreateView(AsyncLoginRequiredMixin, AsyncFormMixin, SubTaskCreateView):
+    success_url = reverse_lazy('async-subtask-list')
+
+class AsyncSubTaskUpdateView(AsyncLoginRequiredMixin, AsyncFormMixin, SubTaskUpdateView):
+    success_url = reverse_lazy('async-subtask-list')
+
+class AsyncSubTaskDeleteView(AsyncLoginRequiredMixin, AsyncDeleteMixin, SubTaskDeleteView):
+    success_url = reverse_lazy('async-subtask-list')
+
+class AsyncCategoryListView(AsyncLoginRequiredMixin, AsyncListMixin, CategoryListView):
+    pass
+
+class AsyncCategoryCreateView(AsyncLoginRequiredMixin, AsyncFormMixin, CategoryCreateView):
+    success_url = reverse_lazy('async-category-list')
+
+class AsyncCategoryUpdateView(AsyncLoginRequiredMixin, AsyncFormMixin, CategoryUpdateView):
+    success_url = reverse_lazy('async-category-list')
+
+class AsyncCategoryDeleteView(AsyncLoginRequiredMixin, AsyncDeleteMixin, CategoryDeleteView):
+    success_url = reverse_lazy('async-category-list')
+
+class AsyncPriorityListView(AsyncLoginRequiredMixin, AsyncListMixin, PriorityListView):
+    pass
+
+class AsyncPriorityCreateView(AsyncLoginRequiredMixin, AsyncFormMixin, PriorityCreateView):
+    success_url = reverse_lazy('async-priority-list')
+
+class AsyncPriorityUpdateView(AsyncLoginRequiredMixin, AsyncFormMixin, PriorityUpdateView):
+    success_url = reverse_lazy('async-priority-list')
+
+class AsyncPriorityDeleteView(AsyncLoginRequiredMixin, AsyncDeleteMixin, PriorityDeleteView):
+    success_url = reverse_lazy('async-priority-list')
@@ -0,0 +1,141 @@
+"""Set-based writes: the bulk actions on the list pages, soft deletes and purging.
+
+Each action is one UPDATE per table inside a transaction. None of them send
+model signals, so they bump the cache generations and repair the counters
+of the parent rows themselves.
+"""
+from django.db import router, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from todohan import lookups
+from todohan.caching import bump_generation
+from todohan.counters import RECOUNTERS
+from todohan.models import Priority, Category, Task, Note, SubTask
+
+# One request may touch at most this many rows
+MAX_ROWS = 1000
+
+# purge_deleted removes at most this many rows per transaction
+PURGE_CHUNK = 500
+
+# Parents holding counters over each model's rows, and the field pointing at them
+COUNTED_PARENTS = {
+    Task: {Category: "category", Priority: "priority"},
+    Note: {Task: "task"},
+    SubTask: {Task: "parent_task"},
+}
+
+# Rows owned by each model's rows, deleted along with them
+CASCADES = {
+    Category: ((Task, "category"),),
+    Priority: ((Task, "priority"),),
+    Task: ((Note, "task"), (SubTask, "parent_task")),
+}
+
+# Children first, so each purge chunk only removes rows that own nothing
+PURGE_ORDER = (SubTask, Note, Task, Category, Priority)
+
+
+def counted_parents(model, changes=None):
+    """The parent models whose counters an update of ``changes`` (or a delete) affects."""
+    parents = COUNTED_PARENTS.get(model, {})
+    if changes is None:
+        return set(parents)
+    if model is SubTask:
+        # completed_subtask_count
+        return {Task} if "status" in changes else set()
+    return {parent for parent, field in parents.items() if field in changes}
+
+
+def parent_pks(queryset, parents):
+    pks = {}
+    for parent in parents:
+        attname = queryset.model._meta.get_field(COUNTED_PARENTS[queryset.model][parent]).attname
+        pks[parent] = set(queryset.order_by().values_list(attname, flat=True).distinct())
+    return pks
+
+
+def summarize(model, pks, changes=None):
+    """Counts for the confirmation page: rows found, rows that would change, and cascaded children."""
+    queryset = model.objects.filter(pk__in=pks)
+    if changes:
+        return queryset.aggregate(rows=Count("pk"), changed=Count("pk", filter=~Q(**changes)))
+    if model is Task:
+        return queryset.aggregate(rows=Count("pk"), subtasks=Sum("subtask_count"), notes=Sum("note_count"))
+    return queryset.aggregate(rows=Count("pk"))
+
+
+def update(model, pks, changes):
+    """Set ``changes`` on the rows of ``pks`` that differ; return how many changed."""
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        queryset = model.objects.using(using).filter(pk__in=pks).exclude(**changes)
+        parents = parent_pks(queryset, counted_parents(model, changes))
+        changed = queryset.update(updated_at=timezone.now(), **changes)
+        if changed:
+            bump_generation(model)
+        for parent, old in parents.items():
+            # Rows moved to a new parent count towards it as well
+            new = changes.get(COUNTED_PARENTS[model][parent])
+            RECOUNTERS[parent](old | {new.pk} if isinstance(new, parent) else old)
+    return changed
+
+
+def mark_deleted(queryset, now, parents, owner=None):
+    """Soft-delete the rows of ``queryset`` and everything they own; return how many rows were marked.
+
+    ``parents`` collects the parent rows whose counters need repairing,
+    except those of ``owner``, the model being deleted above these rows.
+    """
+    model = queryset.model
+    using = queryset.db
+    for child, field in CASCADES.get(model, ()):
+        mark_deleted(child.objects.using(using).filter(**{f"{field}__in": queryset.values("pk")}), now, parents, model)
+    for parent, pks in parent_pks(queryset, counted_parents(model) - {owner}).items():
+        parents.setdefault(parent, set()).update(pks)
+    # updated_at moves too, so the sync endpoint sends the row as a tombstone
+    marked = queryset.update(deleted_at=now, updated_at=now)
+    if marked:
+        bump_generation(model)
+        if model in lookups.LOOKUP_MODELS:
+            lookups.invalidate(model)
+    return marked
+
+
+def delete(model, pks):
+    """Soft-delete the rows of ``pks``, with their tasks, notes and subtasks; return how many were deleted."""
+    using = router.db_for_write(model)
+    parents = {}
+    with transaction.atomic(using=using):
+        deleted = mark_deleted(model.objects.using(using).filter(pk__in=pks), timezone.now(), parents)
+        for parent, old in parents.items():
+            RECOUNTERS[parent](old)
+    return deleted
+
+
+def raw_delete(queryset):
+    """Hard-delete the rows of ``queryset`` and what they own, one DELETE per table.
+
+    This is the cascade the deletion collector would otherwise run in
+    Python, loading every row and sending signals for each.
+    """
+    using = queryset.db
+    for child, field in CASCADES.get(queryset.model, ()):
+        raw_delete(child.all_objects.using(using).filter(**{f"{field}__in": queryset.values("pk")}))
+    return queryset._raw_delete(using)
+
+
+def purge(model, before, chunk_size=PURGE_CHUNK):
+    """Hard-delete ``model`` rows soft-deleted before ``before``, ``chunk_size`` per transaction."""
+    using = router.db_for_write(model)
+    purged = 0
+    while True:
+        with transaction.atomic(using=using):
+            pks = list(
+                model.all_objects.using(using).deleted().filter(deleted_at__lt=before)
+                .order_by("deleted_at").values_list("pk", flat=True)[:chunk_size]
+            )
+            if not pks:
+                return purged
+            purged += raw_delete(model.all_objects.using(using).filter(pk__in=pks))
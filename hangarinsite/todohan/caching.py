@@ -0,0 +1,88 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+GENERATION_KEY = "todohan:generation:{label}"
+PAGE_KEY = "todohan:page:{view}:{user}:{path}:{generations}"
+HITS_KEY = "todohan:page-cache:hits"
+MISSES_KEY = "todohan:page-cache:misses"
+
+
+def generation_key(model):
+    return GENERATION_KEY.format(label=model._meta.label_lower)
+
+
+def get_generations(models):
+    """Current generation counter of each model, in the order given."""
+    keys = [generation_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Seed with a timestamp so an evicted counter never points back at old entries
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump_generation(*models):
+    for model in models:
+        key = generation_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def page_cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
+
+
+class CachedPageMixin:
+    """Cache GET responses per user and query string.
+
+    Keys include the generation of every model in ``cache_models``; saving or
+    deleting any of them bumps its generation, so stale pages are never served.
+    """
+    cache_models = ()
+    cache_timeout = 60 * 60
+
+    def get_page_cache_key(self):
+        request = self.request
+        return PAGE_KEY.format(
+            view=type(self).__qualname__,
+            user=request.user.pk,
+            path=hashlib.md5(request.get_full_path().encode()).hexdigest(),
+            generations=".".join(str(g) for g in get_generations(self.cache_models)),
+        )
+
+    def get_cached_page(self):
+        """Return ``(key, response)``; ``response`` is None on a miss."""
+        key = self.get_page_cache_key()
+        response = cache.get(key)
+        count(HITS_KEY if response is not None else MISSES_KEY)
+        return key, response
+
+    def cache_page(self, key, response):
+        if response.status_code == 200:
+            if hasattr(response, "add_post_render_callback"):
+                response.add_post_render_callback(lambda r: cache.set(key, r, self.cache_timeout))
+            else:
+                cache.set(key, response, self.cache_timeout)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        key, response = self.get_cached_page()
+        if response is not None:
+            return response
+        return self.cache_page(key, super().get(request, *args, **kwargs))
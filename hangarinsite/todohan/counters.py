@@ -0,0 +1,176 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from todohan.caching import bump_generation
+from todohan.models import Priority, Category, Task, Note, SubTask
+
+COMPLETED = "Completed"
+
+# Fields whose old value the signals need to work out what changed
+TRACKED_FIELDS = {
+    Task: ("category_id", "priority_id"),
+    Note: ("task_id",),
+    SubTask: ("parent_task_id", "status"),
+}
+
+
+def adjust(model, pk, **deltas):
+    """Add ``deltas`` to counter fields of one row with F() expressions."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if pk is None or not deltas:
+        return
+    # Touch updated_at so ETags and the sync endpoint pick up the new counts
+    model.objects.filter(pk=pk).update(
+        updated_at=timezone.now(),
+        **{name: F(name) + delta for name, delta in deltas.items()},
+    )
+    # QuerySet.update() sends no signals
+    bump_generation(model)
+
+
+def move(model, old_pk, new_pk, **deltas):
+    if old_pk == new_pk:
+        return
+    adjust(model, old_pk, **{name: -delta for name, delta in deltas.items()})
+    adjust(model, new_pk, **deltas)
+
+
+def old_values(instance):
+    return getattr(instance, "_loaded_values", {})
+
+
+def snapshot(sender, instance, raw=False, **kwargs):
+    """pre_save: load the old tracked values when the instance wasn't read from the database."""
+    if raw or instance.pk is None:
+        return
+    fields = TRACKED_FIELDS[sender]
+    if all(name in old_values(instance) for name in fields):
+        return
+    row = sender._base_manager.filter(pk=instance.pk).values(*fields).first()
+    instance._loaded_values = {**old_values(instance), **(row or {})}
+
+
+def remember(instance):
+    instance._loaded_values = {
+        **old_values(instance),
+        **{name: getattr(instance, name) for name in TRACKED_FIELDS[type(instance)]},
+    }
+
+
+def counted(instance, raw=False):
+    # Soft-deleted rows were taken off the counters when they were marked
+    return not raw and instance.deleted_at is None
+
+
+def task_saved(sender, instance, created, raw=False, **kwargs):
+    if not counted(instance, raw):
+        return
+    old = {} if created else old_values(instance)
+    move(Category, old.get("category_id"), instance.category_id, task_count=1)
+    move(Priority, old.get("priority_id"), instance.priority_id, task_count=1)
+    remember(instance)
+
+
+def task_deleted(sender, instance, **kwargs):
+    if not counted(instance):
+        return
+    adjust(Category, old_values(instance).get("category_id", instance.category_id), task_count=-1)
+    adjust(Priority, old_values(instance).get("priority_id", instance.priority_id), task_count=-1)
+
+
+def note_saved(sender, instance, created, raw=False, **kwargs):
+    if not counted(instance, raw):
+        return
+    old = {} if created else old_values(instance)
+    move(Task, old.get("task_id"), instance.task_id, note_count=1)
+    remember(instance)
+
+
+def note_deleted(sender, instance, **kwargs):
+    if not counted(instance):
+        return
+    adjust(Task, old_values(instance).get("task_id", instance.task_id), note_count=-1)
+
+
+def subtask_saved(sender, instance, created, raw=False, **kwargs):
+    if not counted(instance, raw):
+        return
+    old = {} if created else old_values(instance)
+    old_parent, new_parent = old.get("parent_task_id"), instance.parent_task_id
+    was_completed = old.get("status") == COMPLETED
+    is_completed = instance.status == COMPLETED
+
+    if old_parent == new_parent:
+        adjust(Task, new_parent, completed_subtask_count=is_completed - was_completed)
+    else:
+        adjust(Task, old_parent, subtask_count=-1, completed_subtask_count=-was_completed)
+        adjust(Task, new_parent, subtask_count=1, completed_subtask_count=int(is_completed))
+    remember(instance)
+
+
+def subtask_deleted(sender, instance, **kwargs):
+    if not counted(instance):
+        return
+    old = old_values(instance)
+    adjust(
+        Task, old.get("parent_task_id", instance.parent_task_id),
+        subtask_count=-1,
+        completed_subtask_count=-(old.get("status", instance.status) == COMPLETED),
+    )
+
+
+def count_of(model, field, **filters):
+    rows = (
+        model.objects.filter(**{field: OuterRef("pk")}, **filters)
+        .order_by().values(field).annotate(n=Count("pk")).values("n")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def repair(queryset, **counts):
+    """Set ``counts`` on the rows of ``queryset`` where they drifted; return how many were fixed."""
+    stale = queryset.annotate(**{f"actual_{name}": value for name, value in counts.items()}).exclude(
+        **{name: F(f"actual_{name}") for name in counts}
+    )
+    fixed = queryset.model.objects.filter(pk__in=stale.values("pk")).update(updated_at=timezone.now(), **counts)
+    if fixed:
+        bump_generation(queryset.model)
+    return fixed
+
+
+def recount_tasks(pks=None):
+    queryset = Task.objects.all() if pks is None else Task.objects.filter(pk__in=pks)
+    return repair(
+        queryset,
+        subtask_count=count_of(SubTask, "parent_task"),
+        completed_subtask_count=count_of(SubTask, "parent_task", status=COMPLETED),
+        note_count=count_of(Note, "task"),
+    )
+
+
+def recount_task_count(model, pks=None):
+    queryset = model.objects.all() if pks is None else model.objects.filter(pk__in=pks)
+    return repair(queryset, task_count=count_of(Task, model._meta.model_name))
+
+
+RECOUNTERS = {
+    Task: recount_tasks,
+    Category: lambda pks=None: recount_task_count(Category, pks),
+    Priority: lambda pks=None: recount_task_count(Priority, pks),
+}
+
+PARENTS = {
+    Task: ((Category, "category_id"), (Priority, "priority_id")),
+    Note: ((Task, "task_id"),),
+    SubTask: ((Task, "parent_task_id"),),
+}
+
+
+def recount_parents(model, objs):
+    """Repair the parents of rows written with bulk_create/bulk_update, which send no signals."""
+    for parent, attname in PARENTS.get(model, ()):
+        pks = {getattr(obj, attname) for obj in objs} | {old_values(obj).get(attname) for obj in objs}
+        pks.discard(None)
+        if pks:
+            RECOUNTERS[parent](pks)
@@ -0,0 +1,36 @@
+from django.conf import settings
+
+# How SQLite reports enumerated pragmas when they are read back
+PRAGMA_NAMES = {
+    "synchronous": {0: "off", 1: "normal", 2: "full", 3: "extra"},
+    "temp_store": {0: "default", 1: "file", 2: "memory"},
+}
+
+
+def get_sqlite_pragmas():
+    return getattr(settings, "TODOHAN_SQLITE_PRAGMAS", {})
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created hook: tune every new SQLite connection."""
+    if connection.vendor != "sqlite":
+        return
+    # Use the raw sqlite3 connection so setup isn't counted against query budgets
+    for name, value in get_sqlite_pragmas().items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+def read_sqlite_pragmas(connection):
+    values = {}
+    with connection.cursor() as cursor:
+        for name in get_sqlite_pragmas():
+            cursor.execute(f"PRAGMA {name}")
+            row = cursor.fetchone()
+            # mmap_size reports nothing for in-memory databases
+            value = row[0] if row else None
+            values[name] = PRAGMA_NAMES.get(name, {}).get(value, value)
+    return values
+
+
+def pragmas_match(expected, actual):
+    return all(str(actual.get(name)).lower() == str(value).lower() for name, value in expected.items())
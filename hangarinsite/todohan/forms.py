@@ -1,12 +1,16 @@
 from django import forms
 from django.forms import ModelForm
-from .models import Task, Note, SubTask
+from .models import Priority, Category, Task, Note, SubTask
+from .lookups import LookupChoiceField
+from .bulk import MAX_ROWS
 
 
 class TaskForm(ModelForm):
     class Meta:
         model = Task
         fields = "__all__"
+        # Choices come from the in-process lookup cache instead of a query per render
+        field_classes = {"category": LookupChoiceField, "priority": LookupChoiceField}
 
 class NoteForm(ModelForm):
     class Meta:
@@ -17,3 +21,87 @@ class SubTaskForm(ModelForm):
     class Meta:
         model = SubTask
         fields = '__all__'
+
+
+# The import validates with the same rules minus the foreign keys, which it
+# resolves itself, so checking a row runs no queries
+
+class TaskImportForm(TaskForm):
+    class Meta(TaskForm.Meta):
+        fields = ["title", "description", "deadline", "status"]
+
+class NoteImportForm(NoteForm):
+    class Meta(NoteForm.Meta):
+        fields = ["content"]
+
+class SubTaskImportForm(SubTaskForm):
+    class Meta(SubTaskForm.Meta):
+        fields = ["title", "status"]
+
+
+class IdListField(forms.Field):
+    """The ids of the rows ticked on a list page, as a sorted list of ints."""
+    widget = forms.MultipleHiddenInput
+    default_error_messages = {
+        "required": "Select at least one row.",
+        "invalid": "Enter a list of ids.",
+        "max_rows": "Select at most %(max)d rows at a time.",
+    }
+
+    def __init__(self, *, max_rows, **kwargs):
+        self.max_rows = max_rows
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            ids = sorted({int(v) for v in value})
+        except (TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages["invalid"], code="invalid")
+        if len(ids) > self.max_rows:
+            raise forms.ValidationError(self.error_messages["max_rows"], code="max_rows", params={"max": self.max_rows})
+        return ids
+
+
+class BulkActionForm(forms.Form):
+    """Pick rows on a list page and one action for all of them.
+
+    Every action except delete names the field it sets; that field's value is
+    submitted alongside.
+    """
+    actions = ()
+    ids = IdListField(max_rows=MAX_ROWS)
+    action = forms.ChoiceField(choices=())
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["action"].choices = [("", "Bulk action ...")] + list(self.actions)
+        for field in self.fields.values():
+            if not field.widget.is_hidden:
+                field.widget.attrs.setdefault("class", "form-control form-control-sm")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get("action")
+        if action and action != "delete" and cleaned_data.get(action) in (None, ""):
+            self.add_error(action, "Choose the new value.")
+        return cleaned_data
+
+    @property
+    def changes(self):
+        """The field values the action sets; empty for delete."""
+        action = self.cleaned_data["action"]
+        return {} if action == "delete" else {action: self.cleaned_data[action]}
+
+
+class TaskBulkActionForm(BulkActionForm):
+    actions = [("status", "Set status"), ("priority", "Set priority"), ("category", "Set category"), ("delete", "Delete")]
+    status = forms.ChoiceField(choices=[("", "Status ...")] + Task._meta.get_field("status").choices, required=False)
+    priority = LookupChoiceField(Priority.objects.all(), required=False, empty_label="Priority ...")
+    category = LookupChoiceField(Category.objects.all(), required=False, empty_label="Category ...")
+
+
+class SubTaskBulkActionForm(BulkActionForm):
+    actions = [("status", "Set status"), ("delete", "Delete")]
+    status = forms.ChoiceField(choices=[("", "Status ...")] + SubTask._meta.get_field("status").choices, required=False)
@@ -0,0 +1,200 @@
+"""Batched, resumable import of tasks with their notes and subtasks.
+
+Reads the files todohan.export writes, CSV or NDJSON, one row at a time.
+Rows are validated with the TaskForm/NoteForm/SubTaskForm rules (see the
+*ImportForm classes), categories and priorities are matched by name
+through an in-memory map, and every ``chunk_size`` rows are written with
+bulk_create in one transaction. The same transaction records how far the
+ImportJob got, so a rerun with the same job key picks up after the last
+committed chunk.
+"""
+import csv
+import json
+import time
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from todohan.caching import bump_generation
+from todohan.counters import COMPLETED, adjust
+from todohan.forms import TaskImportForm, NoteImportForm, SubTaskImportForm
+from todohan.lookups import get_lookup
+from todohan.models import Priority, Category, Task, Note, SubTask, ImportJob
+
+IMPORT_CHUNK = 1000
+
+# Errors kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+IMPORT_FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+def read_records(lines, format):
+    """Yield ``(number, record, errors)`` for each row of ``lines``, numbered from 1."""
+    if format == "csv":
+        for number, record in enumerate(csv.DictReader(lines), 1):
+            try:
+                for name in ("notes", "subtasks"):
+                    record[name] = json.loads(record.get(name) or "[]")
+            except ValueError:
+                yield number, None, {name: ["Not valid JSON."]}
+                continue
+            yield number, record, None
+        return
+
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, None, {"__all__": ["Not valid JSON."]}
+            continue
+        if not isinstance(record, dict):
+            yield number, None, {"__all__": ["Expected a JSON object."]}
+            continue
+        yield number, record, None
+
+
+class NameMap:
+    """Category or Priority pks by name, creating each missing name once."""
+
+    def __init__(self, model):
+        self.model = model
+        self.pks = {}
+        # Lowest pk wins when names repeat
+        for obj in reversed(get_lookup(model).objects):
+            self.pks[obj.name] = obj.pk
+
+    def __getitem__(self, name):
+        if name not in self.pks:
+            self.pks[name] = self.model.objects.create(name=name).pk
+        return self.pks[name]
+
+
+class TaskImporter:
+
+    def __init__(self, job, chunk_size=IMPORT_CHUNK, progress=None):
+        self.job = job
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.categories = NameMap(Category)
+        self.priorities = NameMap(Priority)
+        self.errors = []
+        self.rows = 0
+        self.started = time.monotonic()
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.monotonic() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+    def run(self, records):
+        """Import ``records`` from ``read_records``, skipping the rows the job already committed."""
+        chunk = []
+        for number, record, errors in records:
+            if number <= self.job.rows_done:
+                continue
+            chunk.append((number, record, errors))
+            if len(chunk) >= self.chunk_size:
+                self.commit(chunk)
+                chunk = []
+        if chunk:
+            self.commit(chunk)
+        self.job.finished_at = timezone.now()
+        self.job.save(update_fields=["finished_at", "updated_at"])
+        return self.job
+
+    def build(self, record):
+        """Validate one record; return ``(task, notes, subtasks)`` or raise ``ValueError(errors)``."""
+        form = TaskImportForm(record)
+        errors = {} if form.is_valid() else dict(form.errors)
+        for name in ("category", "priority"):
+            value = record.get(name)
+            if not isinstance(value, str) or not value.strip():
+                errors[name] = ["This field is required."]
+        children = []
+        for name, form_class in (("notes", NoteImportForm), ("subtasks", SubTaskImportForm)):
+            items = record.get(name) or []
+            forms = [form_class(item) if isinstance(item, dict) else None for item in items]
+            if not isinstance(items, list) or not all(f is not None and f.is_valid() for f in forms):
+                errors[name] = ["Invalid %s." % name]
+            children.append(forms)
+        if errors:
+            raise ValueError(errors)
+
+        task = form.save(commit=False)
+        task.category_id = self.categories[record["category"].strip()]
+        task.priority_id = self.priorities[record["priority"].strip()]
+        notes = [f.save(commit=False) for f in children[0]]
+        subtasks = [f.save(commit=False) for f in children[1]]
+        # The counters are known up front, so the signals' F() updates aren't needed
+        task.note_count = len(notes)
+        task.subtask_count = len(subtasks)
+        task.completed_subtask_count = sum(subtask.status == COMPLETED for subtask in subtasks)
+        return task, notes, subtasks
+
+    def commit(self, chunk):
+        built, failed = [], 0
+        with transaction.atomic():
+            for number, record, errors in chunk:
+                if errors is None:
+                    try:
+                        built.append(self.build(record))
+                        continue
+                    except ValueError as e:
+                        errors = e.args[0]
+                failed += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({"row": number, "errors": errors})
+
+            tasks = Task.objects.bulk_create([task for task, _, _ in built])
+            for task, notes, subtasks in built:
+                for note in notes:
+                    note.task = task
+                for subtask in subtasks:
+                    subtask.parent_task = task
+            Note.objects.bulk_create([note for _, notes, _ in built for note in notes])
+            SubTask.objects.bulk_create([subtask for _, _, subtasks in built for subtask in subtasks])
+
+            for model, attname in ((Category, "category_id"), (Priority, "priority_id")):
+                for pk, n in Counter(getattr(task, attname) for task in tasks).items():
+                    adjust(model, pk, task_count=n)
+
+            self.job.rows_done = chunk[-1][0]
+            self.job.tasks_created += len(tasks)
+            self.job.rows_failed += failed
+            self.job.save(update_fields=["rows_done", "tasks_created", "rows_failed", "updated_at"])
+        # bulk_create sends no signals
+        bump_generation(Task, Note, SubTask)
+
+        self.rows += len(chunk)
+        if self.progress:
+            self.progress(self)
+
+    def report(self):
+        job = self.job
+        return {
+            "job": job.key,
+            "rows": job.rows_done,
+            "tasks_created": job.tasks_created,
+            "failed": job.rows_failed,
+            "finished": job.finished_at is not None,
+            "rows_per_second": round(self.rows_per_second, 1),
+            "errors": self.errors,
+        }
+
+
+def import_tasks(lines, format, key, chunk_size=IMPORT_CHUNK, restart=False, progress=None):
+    """Import an export file's ``lines`` under the ImportJob ``key``; return the finished importer."""
+    job, created = ImportJob.objects.get_or_create(key=key)
+    if restart and not created:
+        job.rows_done = job.tasks_created = job.rows_failed = 0
+        job.finished_at = None
+        job.save()
+    importer = TaskImporter(job, chunk_size, progress)
+    importer.run(read_records(lines, format))
+    return importer
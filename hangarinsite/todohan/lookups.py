@@ -0,0 +1,127 @@
+"""Process-local copies of the reference tables, Category and Priority.
+
+Both tables are tiny and rarely change, but every task form and task card
+needs them. Each process loads a table once and keeps it until the table's
+version stamp in the cache moves; saving or deleting a row bumps the stamp
+(see todohan.signals). The stamp only reaches other workers and management
+commands because CACHES is shared between processes (see settings.py).
+
+Cached instances are shared between requests and must be treated as read-only.
+"""
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.forms.models import ModelChoiceField, ModelChoiceIterator
+
+from todohan.models import Priority, Category
+
+LOOKUP_MODELS = (Category, Priority)
+VERSION_KEY = "todohan:lookup-version:{label}"
+
+Lookup = namedtuple("Lookup", ["version", "objects", "by_pk"])
+
+_loaded = {}
+
+
+def version_key(model):
+    return VERSION_KEY.format(label=model._meta.label_lower)
+
+
+def get_version(model):
+    key = version_key(model)
+    version = cache.get(key)
+    if version is None:
+        # Seeded like the page-cache generations, so an evicted stamp never matches an old copy
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(model):
+    key = version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate(sender, **kwargs):
+    bump_version(sender)
+    # Bump again once the write is visible, in case another worker reloaded in between
+    transaction.on_commit(lambda: bump_version(sender), robust=True)
+
+
+def get_lookup(model):
+    """The current ``Lookup`` for ``model``, reloading it if its version moved."""
+    version = get_version(model)
+    lookup = _loaded.get(model)
+    if lookup is None or lookup.version != version:
+        objects = list(model._default_manager.order_by("pk"))
+        lookup = _loaded[model] = Lookup(version, objects, {obj.pk: obj for obj in objects})
+    return lookup
+
+
+def attach_lookups(objs, *fields):
+    """Fill the ``fields`` foreign keys of ``objs`` from the lookup cache instead of the database.
+
+    Relations that are already loaded, e.g. by select_related(), are left alone.
+    """
+    objs = list(objs)
+    for name in fields:
+        field = objs[0]._meta.get_field(name) if objs else None
+        missing = [obj for obj in objs if not field.is_cached(obj)] if field else []
+        if not missing:
+            continue
+        by_pk = get_lookup(field.related_model).by_pk
+        for obj in missing:
+            related = by_pk.get(getattr(obj, field.attname))
+            if related is not None:
+                field.set_cached_value(obj, related)
+    return objs
+
+
+class LookupChoiceIterator(ModelChoiceIterator):
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in get_lookup(self.queryset.model).objects:
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(get_lookup(self.queryset.model).objects) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(get_lookup(self.queryset.model).objects)
+
+
+class LookupChoiceField(ModelChoiceField):
+    """ModelChoiceField for a lookup model whose choices and cleaning use the lookup cache."""
+    iterator = LookupChoiceIterator
+
+    def to_python(self, value):
+        model = self.queryset.model
+        if value in self.empty_values or self.to_field_name not in (None, model._meta.pk.name):
+            return super().to_python(value)
+        try:
+            obj = get_lookup(model).by_pk.get(model._meta.pk.to_python(value))
+        except ValidationError:
+            obj = None
+        # Unknown or malformed values go through the usual query and its error messages
+        return obj if obj is not None else super().to_python(value)
+
+
+class LookupListMixin:
+    """Attach the ``lookup_related`` objects to the rows of a ListView page from the lookup cache."""
+    lookup_related = ()
+
+    def attach_lookups(self, objs):
+        return attach_lookups(objs, *self.lookup_related)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        self.attach_lookups(context["object_list"])
+        return context
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from todohan.archive import ARCHIVE_CHUNK, archive_completed
+
+
+class Command(BaseCommand):
+    help = 'Move completed tasks, with their notes and subtasks, into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=float, default=90, metavar='DAYS',
+            help='Only archive tasks last changed at least this many days ago (default: 90)',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=ARCHIVE_CHUNK,
+            help=f'Tasks moved per transaction (default: {ARCHIVE_CHUNK})',
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['older_than'])
+        archived = archive_completed(
+            before, options['chunk_size'], progress=lambda n: self.stderr.write(f'{n} tasks archived...'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Tasks: {archived} archived.'))
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import math
+import shutil
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_databases, setup_test_environment
+from django.test.utils import teardown_databases, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from todohan.models import Category, Priority, Task, Note, SubTask
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the todohan views against a scratch database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1000, help='Tasks to seed')
+        parser.add_argument('--notes', type=int, default=1000, help='Notes to seed')
+        parser.add_argument('--subtasks', type=int, default=1000, help='Subtasks to seed')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=10,
+                            help='Concurrent clients for the sync vs async throughput comparison (0 to skip)')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--baseline', help='Compare against a previously saved JSON report')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95 slowdown against the baseline (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+
+        # A cache of its own, so the shared one is neither cleared nor filled
+        # with pages built from the scratch database
+        cache_dir = tempfile.mkdtemp(prefix='hangarin-benchmark-')
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir}}
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(CACHES=caches):
+                self.seed(options)
+                report = self.run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['tolerance'])
+
+    def seed(self, options):
+        for i in range(5):
+            Category.objects.create(name=f'Category {i}')
+            Priority.objects.create(name=f'Priority {i}')
+        call_command(
+            'create_initial_data',
+            tasks=options['tasks'], notes=options['notes'], subtasks=options['subtasks'],
+            seed=0, stdout=StringIO(),
+        )
+        self.user = User.objects.create_user('benchmark', password='benchmark')
+        self.category = Category.objects.first()
+        self.priority = Priority.objects.first()
+
+    def task_data(self, title):
+        return {
+            'title': title,
+            'description': 'Benchmark task',
+            'deadline': timezone.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'status': 'Pending',
+            'category': self.category.pk,
+            'priority': self.priority.pk,
+        }
+
+    def new_task(self):
+        return Task.objects.create(
+            title='Disposable task',
+            description='Benchmark task',
+            deadline=timezone.now(),
+            category=self.category,
+            priority=self.priority,
+        )
+
+    def scenarios(self):
+        """(name, prepare) pairs; prepare() runs untimed and returns (method, url, data)."""
+        task = Task.objects.order_by('pk').first()
+        note = Note.objects.order_by('pk').first()
+        subtask = SubTask.objects.order_by('pk').first()
+        word = task.title.split()[0]
+
+        get = lambda url: lambda: ('get', url, None)  # noqa: E731
+        scenarios = [
+            ('home', get(reverse('home'))),
+            ('task-list', get(reverse('task-list'))),
+        ]
+        for sort_by in ('title', 'status', 'category__name', 'priority__name'):
+            scenarios.append((f'task-list?sort_by={sort_by}', get(f"{reverse('task-list')}?sort_by={sort_by}")))
+        scenarios += [
+            ('task-list?q', get(f"{reverse('task-list')}?q={word}")),
+            ('note-list', get(reverse('note-list'))),
+            ('note-list?q', get(f"{reverse('note-list')}?q={word}")),
+            ('subtask-list', get(reverse('subtask-list'))),
+            ('subtask-list?q', get(f"{reverse('subtask-list')}?q={word}")),
+            ('priority-list', get(reverse('priority-list'))),
+            ('category-list', get(reverse('category-list'))),
+            ('task-add', get(reverse('task-add'))),
+            ('task-update', get(reverse('task-update', args=[task.pk]))),
+            ('task-delete', get(reverse('task-delete', args=[task.pk]))),
+            ('note-add', get(reverse('note-add'))),
+            ('note-edit', get(reverse('note-edit', args=[note.pk]))),
+            ('subtask-add', get(reverse('subtask-add'))),
+            ('subtask-edit', get(reverse('subtask-edit', args=[subtask.pk]))),
+            ('task-add POST', lambda: ('post', reverse('task-add'), self.task_data('Benchmark task'))),
+            ('task-update POST', lambda: (
+                'post', reverse('task-update', args=[task.pk]), self.task_data(task.title),
+            )),
+            ('task-delete POST', lambda: (
+                'post', reverse('task-delete', args=[self.new_task().pk]), {},
+            )),
+        ]
+        return scenarios
+
+    def request(self, client, prepare):
+        method, url, data = prepare()
+        started = time.perf_counter()
+        response = getattr(client, method)(url, data) if data is not None else getattr(client, method)(url)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise CommandError(f'{method.upper()} {url} returned {response.status_code}')
+        return elapsed
+
+    def run(self, options):
+        client = Client()
+        client.force_login(self.user)
+        cache.clear()
+
+        results = {}
+        for name, prepare in self.scenarios():
+            for _ in range(options['warmup']):
+                self.request(client, prepare)
+
+            timings = [self.request(client, prepare) for _ in range(options['iterations'])]
+
+            # Queries and memory are measured on a separate pass so tracing does not skew latency
+            tracemalloc.start()
+            with CaptureQueriesContext(connection) as queries:
+                self.request(client, prepare)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[name] = {
+                'p50_ms': round(percentile(timings, 50) * 1000, 3),
+                'p95_ms': round(percentile(timings, 95) * 1000, 3),
+                'p99_ms': round(percentile(timings, 99) * 1000, 3),
+                'queries': len(queries),
+                'peak_memory_kb': round(peak / 1024, 1),
+            }
+
+        report = {
+            'scale': {key: options[key] for key in ('tasks', 'notes', 'subtasks')},
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        if options['concurrency'] > 0:
+            report['concurrency'] = options['concurrency']
+            report['throughput'] = self.throughput(options['concurrency'], options['iterations'])
+        return report
+
+    def throughput(self, concurrency, iterations):
+        """Requests per second for each sync view and its async counterpart under concurrent clients."""
+        task = Task.objects.order_by('pk').first()
+        pairs = [
+            ('home', reverse('home'), reverse('async-home')),
+            ('task-list', reverse('task-list'), reverse('async-task-list')),
+            ('task-list?q', f"{reverse('task-list')}?q={task.title.split()[0]}",
+             f"{reverse('async-task-list')}?q={task.title.split()[0]}"),
+            ('note-list', reverse('note-list'), reverse('async-note-list')),
+            ('subtask-list', reverse('subtask-list'), reverse('async-subtask-list')),
+            ('task-update', reverse('task-update', args=[task.pk]), reverse('async-task-update', args=[task.pk])),
+        ]
+        results = {}
+        for name, sync_url, async_url in pairs:
+            results[name] = {
+                'sync_rps': asyncio.run(self.load(sync_url, concurrency, iterations)),
+                'async_rps': asyncio.run(self.load(async_url, concurrency, iterations)),
+            }
+        return results
+
+    async def load(self, url, concurrency, iterations):
+        clients = [AsyncClient() for _ in range(concurrency)]
+        for client in clients:
+            await client.aforce_login(self.user)
+
+        async def worker(client):
+            for _ in range(iterations):
+                response = await client.get(url)
+                if response.status_code >= 400:
+                    raise CommandError(f'GET {url} returned {response.status_code}')
+
+        # Sync views run in Django's sync_to_async thread; async views only hop there for queries
+        await cache.aclear()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for client in clients))
+        elapsed = time.perf_counter() - started
+        return round(concurrency * iterations / elapsed, 1)
+
+    def compare(self, report, baseline_path, tolerance):
+        with open(baseline_path) as f:
+            baseline = json.load(f)['results']
+
+        regressions = []
+        for name, result in report['results'].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+            if result['queries'] > before['queries']:
+                regressions.append(f"{name}: queries {before['queries']} -> {result['queries']}")
+
+        if regressions:
+            raise CommandError('Performance regressions against baseline:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
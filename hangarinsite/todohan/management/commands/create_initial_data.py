@@ -1,55 +1,169 @@
-from django.core.management.base import BaseCommand
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from faker import Faker
 from django.utils import timezone
 from todohan.models import Category, Priority, Task, Note, SubTask
+from todohan.caching import bump_generation
+from todohan.counters import RECOUNTERS
+
+STATUSES = ["Pending", "In Progress", "Completed"]
+
+_faker = None
+
+
+def get_faker(seed):
+    # One Faker per worker process, reseeded for every chunk
+    global _faker
+    if _faker is None:
+        _faker = Faker()
+    _faker.seed_instance(seed)
+    return _faker
+
+
+def fake_task_rows(count, seed):
+    fake = get_faker(seed)
+    return [
+        (
+            ' '.join(fake.word() for _ in range(2)).title(),
+            fake.sentence(nb_words=5),
+            fake.date_time_this_month(),
+            fake.random_element(elements=STATUSES),
+        )
+        for _ in range(count)
+    ]
+
+
+def fake_note_rows(count, seed):
+    fake = get_faker(seed)
+    return [fake.paragraph(nb_sentences=3) for _ in range(count)]
+
+
+def fake_subtask_rows(count, seed):
+    fake = get_faker(seed)
+    return [
+        (
+            ' '.join(fake.word() for _ in range(2)).title(),
+            fake.random_element(elements=STATUSES),
+        )
+        for _ in range(count)
+    ]
+
 
 class Command(BaseCommand):
     help = 'Create initial data for the application'
 
-    def handle(self, *args, **kwargs):
-        self.create_tasks(10)
-        self.create_notes(10)
-        self.create_subtasks(10)
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=10, help='Number of tasks to create')
+        parser.add_argument('--notes', type=int, default=10, help='Number of notes to create')
+        parser.add_argument('--subtasks', type=int, default=10, help='Number of subtasks to create')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk_create and transaction')
+        parser.add_argument('--workers', type=int, default=1, help='Processes used to generate Faker data')
+        parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible data')
 
-    def create_tasks(self, count):
-        fake = Faker()
-        
-        for _ in range(count):
-            words = [fake.word() for _ in range(2)]
-            task_name = ' '.join(words)
-            Task.objects.create(
-                title=task_name.title(),
-                description=fake.sentence(nb_words=5),
-                deadline=timezone.make_aware(fake.date_time_this_month()),
-                status=fake.random_element(elements=["Pending", "In Progress", "Completed"]),
-                category=Category.objects.order_by('?').first(),
-                priority=Priority.objects.order_by('?').first()
-            )
-        self.stdout.write(self.style.SUCCESS(f'Initial data for tasks created successfully.'))
-
-    
-    def create_notes(self, count):
-        fake = Faker()
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be at least 1.')
 
-        for _ in range(count):
-            Note.objects.create(
-                task=Task.objects.order_by('?').first(),
-                content=fake.paragraph(nb_sentences=3)
-            )
-        self.stdout.write(self.style.SUCCESS(f'Initial data for notes created successfully.'))
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+        self.random = random.Random(options['seed'])
+        self.seed = self.random.randrange(2 ** 32)
 
-    def create_subtasks(self, count):
-        fake=Faker()
+        self.create_tasks(options['tasks'])
+        self.create_notes(options['notes'])
+        self.create_subtasks(options['subtasks'])
+
+        # bulk_create does not send post_save, so fix the counters and invalidate cached pages explicitly
+        for recount in RECOUNTERS.values():
+            recount()
+        bump_generation(Task, Note, SubTask)
+
+    def generate(self, func, count):
+        """Yield generated rows one batch at a time, optionally from a process pool."""
+        sizes = [min(self.batch_size, count - start) for start in range(0, count, self.batch_size)]
+        seeds = [self.seed + i for i in range(len(sizes))]
+        self.seed += len(sizes)
+
+        if self.workers == 1:
+            for size, seed in zip(sizes, seeds):
+                yield func(size, seed)
+            return
 
-        for _ in range(count):
-            words = [fake.word() for _ in range(2)]
-            subtask_name = ' '.join(words)
-            SubTask.objects.create(
-                parent_task=Task.objects.order_by('?').first(),
-                title=subtask_name.title(),
-                status=fake.random_element(elements=["Pending", "In Progress", "Completed"])
-            )
-        self.stdout.write(self.style.SUCCESS(f'Initial data for subtasks created successfully.'))
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            # Keep a bounded number of batches in flight so memory stays flat
+            pending = deque()
+            for size, seed in zip(sizes, seeds):
+                pending.append(pool.submit(func, size, seed))
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
 
+    def insert(self, model, objs):
+        with transaction.atomic():
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
 
+    def report(self, label, count, started):
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else count
+        self.stdout.write(self.style.SUCCESS(
+            f'Initial data for {label} created successfully ({count} rows, {rate:.0f} rows/s).'
+        ))
+
+    def pk_list(self, model):
+        pks = list(model.objects.values_list('pk', flat=True))
+        if not pks:
+            raise CommandError(f'Create at least one {model._meta.verbose_name} first.')
+        return pks
+
+    def create_tasks(self, count):
+        if count <= 0:
+            return
+        started = time.monotonic()
+        category_ids = self.pk_list(Category)
+        priority_ids = self.pk_list(Priority)
+
+        for rows in self.generate(fake_task_rows, count):
+            self.insert(Task, [
+                Task(
+                    title=title,
+                    description=description,
+                    deadline=timezone.make_aware(deadline),
+                    status=status,
+                    category_id=self.random.choice(category_ids),
+                    priority_id=self.random.choice(priority_ids),
+                )
+                for title, description, deadline, status in rows
+            ])
+        self.report('tasks', count, started)
+
+    def create_notes(self, count):
+        if count <= 0:
+            return
+        started = time.monotonic()
+        task_ids = self.pk_list(Task)
+
+        for rows in self.generate(fake_note_rows, count):
+            self.insert(Note, [
+                Note(task_id=self.random.choice(task_ids), content=content)
+                for content in rows
+            ])
+        self.report('notes', count, started)
+
+    def create_subtasks(self, count):
+        if count <= 0:
+            return
+        started = time.monotonic()
+        task_ids = self.pk_list(Task)
 
+        for rows in self.generate(fake_subtask_rows, count):
+            self.insert(SubTask, [
+                SubTask(parent_task_id=self.random.choice(task_ids), title=title, status=status)
+                for title, status in rows
+            ])
+        self.report('subtasks', count, started)
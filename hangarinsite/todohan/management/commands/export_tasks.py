@@ -0,0 +1,43 @@
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from todohan.export import EXPORT_CHUNK, EXPORT_FORMATS, export_lines
+from todohan.models import Task, ArchivedTask
+from todohan.views import filter_tasks
+
+
+class Command(BaseCommand):
+    help = 'Stream tasks with their notes and subtasks as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', '-o', help='File to write (default: standard output)')
+        parser.add_argument('-q', dest='q', help='Search, as in the task list')
+        parser.add_argument('--sort-by', help='Sort field, as in the task list (default: deadline)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK, help='Tasks read per query')
+        parser.add_argument('--archived', action='store_true', help='Follow the live tasks with the archived ones')
+
+    def handle(self, *args, **options):
+        params = {name: options[name] for name in ('q', 'sort_by') if options[name]}
+        archived = filter_tasks(ArchivedTask.objects.all(), params) if options['archived'] else None
+        lines = export_lines(
+            filter_tasks(Task.objects.all(), params), options['format'], options['chunk_size'], archived,
+        )
+        # The CSV header is not a task
+        count = -1 if options['format'] == 'csv' else 0
+
+        started = time.monotonic()
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(line)
+                    count += 1
+        else:
+            write = partial(self.stdout.write, ending='')
+            for line in lines:
+                write(line)
+                count += 1
+        self.stderr.write(
+            f'Exported {count} tasks in {time.monotonic() - started:.1f}s.', style_func=self.style.SUCCESS,
+        )
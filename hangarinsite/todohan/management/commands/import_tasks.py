@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from todohan.importer import IMPORT_CHUNK, IMPORT_FORMATS, import_tasks
+
+
+class Command(BaseCommand):
+    help = 'Import tasks with their notes and subtasks from a CSV or NDJSON export, resuming where a previous run stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(set(IMPORT_FORMATS.values())),
+                            help='File format (default: guessed from the extension)')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK,
+                            help=f'Rows written per transaction (default: {IMPORT_CHUNK})')
+        parser.add_argument('--job', help='Import job key to resume (default: based on the file path)')
+        parser.add_argument('--restart', action='store_true', help='Start the job over from the first row')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        format = options['format'] or IMPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+        if format is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format.')
+
+        def progress(importer):
+            job = importer.job
+            self.stderr.write(
+                f'Row {job.rows_done}: {job.tasks_created} tasks created, {job.rows_failed} failed '
+                f'({importer.rows_per_second:.0f} rows/s)'
+            )
+
+        with open(path, newline='', encoding='utf-8') as f:
+            importer = import_tasks(
+                f, format, options['job'] or f'file:{path}', options['chunk_size'], options['restart'], progress,
+            )
+
+        for error in importer.errors:
+            self.stderr.write(self.style.WARNING(f"Row {error['row']}: {error['errors']}"))
+        job = importer.job
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {job.tasks_created} tasks from {job.rows_done} rows ({job.rows_failed} failed).'
+        ))
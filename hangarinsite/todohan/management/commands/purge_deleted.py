@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from todohan.bulk import PURGE_CHUNK, PURGE_ORDER, purge
+
+
+class Command(BaseCommand):
+    help = 'Permanently remove soft-deleted tasks, notes, subtasks, categories and priorities'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=float, default=7, metavar='DAYS',
+            help='Only purge rows deleted at least this many days ago (default: 7; 0 purges everything)',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=PURGE_CHUNK,
+            help=f'Rows removed per transaction (default: {PURGE_CHUNK})',
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['older_than'])
+        for model in PURGE_ORDER:
+            purged = purge(model, before, options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural.capitalize()}: {purged} purged.'
+            ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from todohan.counters import RECOUNTERS
+
+
+class Command(BaseCommand):
+    help = 'Repair the denormalized subtask, note and task counters'
+
+    def handle(self, *args, **options):
+        for model, recount in RECOUNTERS.items():
+            with transaction.atomic():
+                fixed = recount()
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural.capitalize()}: {fixed} repaired.'
+            ))
@@ -0,0 +1,143 @@
+"""In-process request metrics, served at /metrics in the Prometheus text format.
+
+todohan.middleware.MetricsMiddleware times every request per URL name, with
+the SQL it runs and the time spent rendering its TemplateResponse; what is
+left is Python. Each process keeps its own totals, so scrape every worker
+(Prometheus adds them up by label).
+"""
+import threading
+import time
+from bisect import bisect_left
+from copy import copy
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# The view label of requests that matched no URL pattern
+UNMATCHED = "unmatched"
+
+REGISTRY = []
+
+
+def format_labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        with self.lock:
+            series = sorted((labels, copy(values)) for labels, values in self.series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, values in series:
+            lines += self.render_series(labels, values)
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render_series(self, labels, value):
+        return [f"{self.name}{format_labels(self.labels, labels)} {format_number(value)}"]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, buckets, labels=()):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        # Counts per bucket, the last one for values above every bound, then the sum
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            values = self.series.get(labels)
+            if values is None:
+                values = self.series[labels] = [0] * (len(self.buckets) + 1) + [0]
+            values[index] += 1
+            values[-1] += value
+
+    def render_series(self, labels, values):
+        lines, total = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), values):
+            total += count
+            le = bound if bound == "+Inf" else format_number(float(bound))
+            lines.append(f"{self.name}_bucket{format_labels(self.labels, labels, le=le)} {total}")
+        lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {format_number(values[-1])}")
+        lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {total}")
+        return lines
+
+
+REQUESTS = Counter(
+    "todohan_requests_total", "Requests handled, by URL name, method and status code.", ("view", "method", "status"),
+)
+REQUEST_SECONDS = Histogram(
+    "todohan_request_duration_seconds", "Time to produce the response, by URL name.", LATENCY_BUCKETS, ("view", "method"),
+)
+SQL_QUERIES = Histogram(
+    "todohan_request_sql_queries", "SQL queries run per request, by URL name.", QUERY_BUCKETS, ("view",),
+)
+SQL_SECONDS = Histogram(
+    "todohan_request_sql_seconds", "Time spent in SQL per request, by URL name.", LATENCY_BUCKETS, ("view",),
+)
+TEMPLATE_SECONDS = Histogram(
+    "todohan_request_template_seconds", "Time spent rendering the TemplateResponse, by URL name.",
+    LATENCY_BUCKETS, ("view",),
+)
+
+
+class QueryTimer:
+    """execute_wrapper that counts queries and the time they take."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def observe_request(request, response, seconds, queries=None):
+    match = request.resolver_match
+    view = match.view_name if match else UNMATCHED
+    REQUESTS.inc(view, request.method, response.status_code)
+    REQUEST_SECONDS.observe(seconds, view, request.method)
+    if queries is not None:
+        SQL_QUERIES.observe(queries.count, view)
+        SQL_SECONDS.observe(queries.seconds, view)
+    template_seconds = getattr(request, "template_seconds", None)
+    if template_seconds is not None:
+        TEMPLATE_SECONDS.observe(template_seconds, view)
+
+
+def render():
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
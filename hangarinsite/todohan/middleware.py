@@ -0,0 +1,306 @@
+import json
+import logging
+import mimetypes
+import os
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from todohan import metrics, slowqueries
+from todohan.routers import request_routing, get_routing_state, get_read_replicas, reads_from_replica
+from todohan.storage import ENCODINGS
+
+logger = logging.getLogger("todohan.querybudget")
+
+PRIMARY_COOKIE = "todohan_primary"
+
+# Hashed names change whenever their content does, so they can be cached for good
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_query_budget(view_func):
+    view_class = getattr(view_func, "view_class", None)
+    return getattr(view_class, "query_budget", None)
+
+
+class QueryBudgetMiddleware:
+    """Count SQL queries per request and log views that go over their ``query_budget``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        budget = getattr(request, "query_budget", None)
+        if budget is not None and counter.count > budget:
+            logger.warning(
+                "%s ran %d queries (budget %d)",
+                request.resolver_match.view_name if request.resolver_match else request.path,
+                counter.count,
+                budget,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Budgets describe page renders; form submissions are not checked
+        if request.method in ("GET", "HEAD"):
+            request.query_budget = get_query_budget(view_func)
+
+    async def __acall__(self, request):
+        # Under ASGI queries run on sync_to_async's thread, whose connections
+        # can't be wrapped from here; budgets are checked on the sync path.
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Record latency, SQL and template time per URL name for /metrics (see todohan.metrics).
+
+    Streaming responses are timed until the response starts; the rows they
+    read while streaming are not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "TODOHAN_METRICS", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        queries = metrics.QueryTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        metrics.observe_request(request, response, time.perf_counter() - started, queries)
+        return response
+
+    def process_template_response(self, request, response):
+        # The handler renders straight after the template response middleware runs
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.template_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    async def __acall__(self, request):
+        # As with query budgets, SQL run on sync_to_async's thread can't be wrapped here
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        metrics.observe_request(request, response, time.perf_counter() - started)
+        return response
+
+
+class SlowQueryMiddleware:
+    """Tag slow queries with the view that ran them, and save them when the slow query table is on."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        view, entries = slowqueries.current_view.set(""), slowqueries.pending.set([])
+        try:
+            response = self.get_response(request)
+            recorded = slowqueries.pending.get()
+        finally:
+            slowqueries.current_view.reset(view)
+            slowqueries.pending.reset(entries)
+        if recorded and slowqueries.table_enabled():
+            slowqueries.save(recorded)
+        return response
+
+    async def __acall__(self, request):
+        view, entries = slowqueries.current_view.set(""), slowqueries.pending.set([])
+        try:
+            response = await self.get_response(request)
+            recorded = slowqueries.pending.get()
+        finally:
+            slowqueries.current_view.reset(view)
+            slowqueries.pending.reset(entries)
+        if recorded and slowqueries.table_enabled():
+            await sync_to_async(slowqueries.save)(recorded)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        slowqueries.current_view.set(request.resolver_match.view_name)
+
+
+class ReplicaRoutingMiddleware:
+    """Let list views read from replicas, keeping a client on the primary right after it writes."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with request_routing(pinned=PRIMARY_COOKIE in request.COOKIES) as state:
+            response = self.get_response(request)
+        return self.stick_to_primary(response, state)
+
+    async def __acall__(self, request):
+        with request_routing(pinned=PRIMARY_COOKIE in request.COOKIES) as state:
+            response = await self.get_response(request)
+        return self.stick_to_primary(response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ("GET", "HEAD") and reads_from_replica(view_func):
+            get_routing_state().use_replica = True
+
+    def stick_to_primary(self, response, state):
+        # The redirect after a form submission should not land on a lagging replica
+        if state.wrote and get_read_replicas():
+            response.set_cookie(
+                PRIMARY_COOKIE, "1",
+                max_age=getattr(settings, "TODOHAN_REPLICA_STICKY_SECONDS", 5),
+                httponly=True, samesite="Lax",
+            )
+        return response
+
+
+def accepted_encodings(header):
+    encodings = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+class StaticFilesMiddleware:
+    """Serve collected static files, preferring the .br/.gz variants built by collectstatic.
+
+    Files are indexed once at startup, so run collectstatic before (re)starting
+    the server. Not used with DEBUG, where runserver serves the app directories.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT or not os.path.isdir(settings.STATIC_ROOT):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.root = str(settings.STATIC_ROOT)
+        self.files = self.index()
+        self.immutable = self.hashed_names()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def index(self):
+        # name -> encodings with a pre-compressed variant on disk
+        files = {}
+        for directory, _, filenames in os.walk(self.root):
+            present = set(filenames)
+            for filename in filenames:
+                if filename.endswith(tuple(ENCODINGS.values())):
+                    continue
+                name = os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, "/")
+                files[name] = [encoding for encoding, suffix in ENCODINGS.items() if filename + suffix in present]
+        return files
+
+    def hashed_names(self):
+        try:
+            with open(os.path.join(self.root, "staticfiles.json")) as f:
+                return set(json.load(f)["paths"].values())
+        except (OSError, ValueError, KeyError):
+            return set()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def serve(self, request):
+        if request.method not in ("GET", "HEAD") or not request.path.startswith(self.prefix):
+            return None
+        name = request.path[len(self.prefix):]
+        if name not in self.files:
+            return None
+
+        path = os.path.join(self.root, name)
+        encoding = None
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        for candidate in self.files[name]:
+            if candidate in accepted:
+                encoding = candidate
+                path += ENCODINGS[candidate]
+                break
+
+        stat = os.stat(path)
+        last_modified = int(stat.st_mtime)
+        # Per variant, so the gzip and identity copies don't validate each other
+        etag = quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+        headers = {
+            "ETag": etag,
+            "Last-Modified": http_date(last_modified),
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if name in self.immutable else STATIC_CACHE_CONTROL,
+        }
+        if self.files[name]:
+            headers["Vary"] = "Accept-Encoding"
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if request.method == "HEAD":
+                response = HttpResponse(content_type=content_type)
+                response.headers["Content-Length"] = stat.st_size
+            else:
+                # Streamed from disk in blocks rather than read into memory
+                response = FileResponse(open(path, "rb"), content_type=content_type)
+                response.headers.pop("Content-Disposition", None)
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+        for header, value in headers.items():
+            response.headers[header] = value
+        return response
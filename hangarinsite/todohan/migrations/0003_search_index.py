@@ -0,0 +1,120 @@
+from django.db import migrations
+
+# FTS5 tables are keyed by the rowid of the source row, so every trigger is a
+# rowid lookup. The trigram tokenizer keeps the substring semantics of icontains.
+FORWARD_SQL = [
+    "CREATE VIRTUAL TABLE todohan_task_fts USING fts5(title, description, tokenize='trigram')",
+    "CREATE VIRTUAL TABLE todohan_note_fts USING fts5(content, task_title, tokenize='trigram')",
+    "CREATE VIRTUAL TABLE todohan_subtask_fts USING fts5(title, parent_task_title, tokenize='trigram')",
+
+    # Task
+    """CREATE TRIGGER todohan_task_fts_ai AFTER INSERT ON todohan_task BEGIN
+        INSERT INTO todohan_task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER todohan_task_fts_au AFTER UPDATE ON todohan_task
+    WHEN new.title IS NOT old.title OR new.description IS NOT old.description BEGIN
+        UPDATE todohan_task_fts SET title = new.title, description = new.description WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER todohan_task_fts_title_au AFTER UPDATE ON todohan_task
+    WHEN new.title IS NOT old.title BEGIN
+        UPDATE todohan_note_fts SET task_title = new.title
+        WHERE rowid IN (SELECT id FROM todohan_note WHERE task_id = new.id);
+        UPDATE todohan_subtask_fts SET parent_task_title = new.title
+        WHERE rowid IN (SELECT id FROM todohan_subtask WHERE parent_task_id = new.id);
+    END""",
+    """CREATE TRIGGER todohan_task_fts_ad AFTER DELETE ON todohan_task BEGIN
+        DELETE FROM todohan_task_fts WHERE rowid = old.id;
+    END""",
+
+    # Note
+    """CREATE TRIGGER todohan_note_fts_ai AFTER INSERT ON todohan_note BEGIN
+        INSERT INTO todohan_note_fts(rowid, content, task_title)
+        VALUES (new.id, new.content, (SELECT title FROM todohan_task WHERE id = new.task_id));
+    END""",
+    """CREATE TRIGGER todohan_note_fts_au AFTER UPDATE ON todohan_note
+    WHEN new.content IS NOT old.content OR new.task_id IS NOT old.task_id BEGIN
+        UPDATE todohan_note_fts
+        SET content = new.content, task_title = (SELECT title FROM todohan_task WHERE id = new.task_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER todohan_note_fts_ad AFTER DELETE ON todohan_note BEGIN
+        DELETE FROM todohan_note_fts WHERE rowid = old.id;
+    END""",
+
+    # SubTask
+    """CREATE TRIGGER todohan_subtask_fts_ai AFTER INSERT ON todohan_subtask BEGIN
+        INSERT INTO todohan_subtask_fts(rowid, title, parent_task_title)
+        VALUES (new.id, new.title, (SELECT title FROM todohan_task WHERE id = new.parent_task_id));
+    END""",
+    """CREATE TRIGGER todohan_subtask_fts_au AFTER UPDATE ON todohan_subtask
+    WHEN new.title IS NOT old.title OR new.parent_task_id IS NOT old.parent_task_id BEGIN
+        UPDATE todohan_subtask_fts
+        SET title = new.title, parent_task_title = (SELECT title FROM todohan_task WHERE id = new.parent_task_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER todohan_subtask_fts_ad AFTER DELETE ON todohan_subtask BEGIN
+        DELETE FROM todohan_subtask_fts WHERE rowid = old.id;
+    END""",
+
+    # Backfill existing rows
+    """INSERT INTO todohan_task_fts(rowid, title, description)
+    SELECT id, title, description FROM todohan_task""",
+    """INSERT INTO todohan_note_fts(rowid, content, task_title)
+    SELECT n.id, n.content, t.title FROM todohan_note n JOIN todohan_task t ON t.id = n.task_id""",
+    """INSERT INTO todohan_subtask_fts(rowid, title, parent_task_title)
+    SELECT s.id, s.title, t.title FROM todohan_subtask s JOIN todohan_task t ON t.id = s.parent_task_id""",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS todohan_task_fts_ai",
+    "DROP TRIGGER IF EXISTS todohan_task_fts_au",
+    "DROP TRIGGER IF EXISTS todohan_task_fts_title_au",
+    "DROP TRIGGER IF EXISTS todohan_task_fts_ad",
+    "DROP TRIGGER IF EXISTS todohan_note_fts_ai",
+    "DROP TRIGGER IF EXISTS todohan_note_fts_au",
+    "DROP TRIGGER IF EXISTS todohan_note_fts_ad",
+    "DROP TRIGGER IF EXISTS todohan_subtask_fts_ai",
+    "DROP TRIGGER IF EXISTS todohan_subtask_fts_au",
+    "DROP TRIGGER IF EXISTS todohan_subtask_fts_ad",
+    "DROP TABLE IF EXISTS todohan_task_fts",
+    "DROP TABLE IF EXISTS todohan_note_fts",
+    "DROP TABLE IF EXISTS todohan_subtask_fts",
+]
+
+
+def fts5_trigram_supported(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.todohan_fts_probe USING fts5(x, tokenize='trigram')")
+        except Exception:
+            return False
+        cursor.execute("DROP TABLE temp.todohan_fts_probe")
+    return True
+
+
+def create_search_index(apps, schema_editor):
+    # Other backends keep using the icontains fallback in todohan.search
+    if not fts5_trigram_supported(schema_editor):
+        return
+    for sql in FORWARD_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in REVERSE_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todohan', '0002_alter_category_options_alter_priority_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
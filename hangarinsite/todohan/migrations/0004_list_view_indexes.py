@@ -0,0 +1,81 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todohan', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['name'], name='category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['created_at'], name='category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['updated_at'], name='category_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['created_at'], name='note_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['updated_at'], name='note_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='priority',
+            index=models.Index(fields=['name'], name='priority_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='priority',
+            index=models.Index(fields=['created_at'], name='priority_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='priority',
+            index=models.Index(fields=['updated_at'], name='priority_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subtask',
+            index=models.Index(fields=['created_at', 'status'], name='subtask_created_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subtask',
+            index=models.Index(fields=['updated_at', 'status'], name='subtask_updated_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subtask',
+            index=models.Index(fields=['title', 'status'], name='subtask_title_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subtask',
+            index=models.Index(fields=['status'], name='subtask_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['deadline', 'status'], name='task_deadline_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['title', 'status'], name='task_title_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status'], name='task_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'deadline'], name='task_status_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['created_at'], name='task_created_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from todohan.migrations._search_triggers import without_search_triggers
+
+
+def count_of(model, field, **filters):
+    rows = (
+        model.objects.filter(**{field: OuterRef("pk")}, **filters)
+        .order_by().values(field).annotate(n=Count("pk")).values("n")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    Task = apps.get_model("todohan", "Task")
+    Note = apps.get_model("todohan", "Note")
+    SubTask = apps.get_model("todohan", "SubTask")
+    Task.objects.update(
+        subtask_count=count_of(SubTask, "parent_task"),
+        completed_subtask_count=count_of(SubTask, "parent_task", status="Completed"),
+        note_count=count_of(Note, "task"),
+    )
+    for name in ("Category", "Priority"):
+        model = apps.get_model("todohan", name)
+        model.objects.update(task_count=count_of(Task, name.lower()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todohan', '0004_list_view_indexes'),
+    ]
+
+    operations = [
+        *without_search_triggers(
+            migrations.AddField(
+                model_name='category',
+                name='task_count',
+                field=models.IntegerField(default=0, editable=False),
+            ),
+            migrations.AddField(
+                model_name='priority',
+                name='task_count',
+                field=models.IntegerField(default=0, editable=False),
+            ),
+            migrations.AddField(
+                model_name='task',
+                name='completed_subtask_count',
+                field=models.IntegerField(default=0, editable=False),
+            ),
+            migrations.AddField(
+                model_name='task',
+                name='note_count',
+                field=models.IntegerField(default=0, editable=False),
+            ),
+            migrations.AddField(
+                model_name='task',
+                name='subtask_count',
+                field=models.IntegerField(default=0, editable=False),
+            ),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+from todohan.migrations._search_triggers import without_search_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todohan', '0005_task_counters'),
+    ]
+
+    operations = [
+        # Adding a nullable column doesn't rebuild the table, but removing it on reverse does
+        *without_search_triggers(
+            migrations.AddField(
+                model_name='category',
+                name='deleted_at',
+                field=models.DateTimeField(blank=True, editable=False, null=True),
+            ),
+            migrations.AddField(
+                model_name='note',
+                name='deleted_at',
+                field=models.DateTimeField(blank=True, editable=False, null=True),
+            ),
+            migrations.AddField(
+                model_name='priority',
+                name='deleted_at',
+                field=models.DateTimeField(blank=True, editable=False, null=True),
+            ),
+            migrations.AddField(
+                model_name='subtask',
+                name='deleted_at',
+                field=models.DateTimeField(blank=True, editable=False, null=True),
+            ),
+            migrations.AddField(
+                model_name='task',
+                name='deleted_at',
+                field=models.DateTimeField(blank=True, editable=False, null=True),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='category_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='note_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='priority',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='priority_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subtask',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='subtask_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='task_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todohan', '0007_import_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNote',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('content', models.TextField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSubTask',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('title', models.CharField(max_length=128)),
+                ('status', models.CharField(max_length=50)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('original_id', models.IntegerField(db_index=True)),
+                ('title', models.CharField(max_length=128)),
+                ('description', models.CharField(max_length=256)),
+                ('deadline', models.DateTimeField()),
+                ('status', models.CharField(max_length=50)),
+                ('subtask_count', models.IntegerField(default=0)),
+                ('completed_subtask_count', models.IntegerField(default=0)),
+                ('note_count', models.IntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'Completed')), fields=['updated_at'], name='task_completed_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='category',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='todohan.category'),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='priority',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='todohan.priority'),
+        ),
+        migrations.AddField(
+            model_name='archivedsubtask',
+            name='parent_task',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subtask_set', to='todohan.archivedtask'),
+        ),
+        migrations.AddField(
+            model_name='archivednote',
+            name='task',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='note_set', to='todohan.archivedtask'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['deadline', 'status'], name='archivedtask_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['title', 'status'], name='archivedtask_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['archived_at'], name='archivedtask_archived_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todohan', '0008_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField()),
+                ('view', models.CharField(blank=True, max_length=200)),
+                ('fingerprint', models.CharField(max_length=32)),
+                ('sql', models.TextField()),
+                ('duration', models.FloatField()),
+                ('plan', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Slow queries',
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:25
+
+import django.db.models.deletion
+import todohan.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todohan', '0009_slow_query'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteSearchIndex',
+            fields=[
+                ('rowid', models.IntegerField(primary_key=True, serialize=False)),
+                ('rank', models.FloatField()),
+                ('document', todohan.models.MatchField(db_column='todohan_note_fts')),
+            ],
+            options={
+                'db_table': 'todohan_note_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SubTaskSearchIndex',
+            fields=[
+                ('rowid', models.IntegerField(primary_key=True, serialize=False)),
+                ('rank', models.FloatField()),
+                ('document', todohan.models.MatchField(db_column='todohan_subtask_fts')),
+            ],
+            options={
+                'db_table': 'todohan_subtask_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TaskSearchIndex',
+            fields=[
+                ('rowid', models.IntegerField(primary_key=True, serialize=False)),
+                ('rank', models.FloatField()),
+                ('document', todohan.models.MatchField(db_column='todohan_task_fts')),
+            ],
+            options={
+                'db_table': 'todohan_task_fts',
+                'managed': False,
+            },
+        ),
+        # The relations have no column, and SQLite's remove_field can't drop a
+        # ForeignObject, so they only exist in the migration state
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AddField(
+                model_name='note',
+                name='search_index',
+                field=models.ForeignObject(blank=True, editable=False, from_fields=['id'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='todohan.notesearchindex', to_fields=['rowid']),
+            ),
+            migrations.AddField(
+                model_name='subtask',
+                name='search_index',
+                field=models.ForeignObject(blank=True, editable=False, from_fields=['id'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='todohan.subtasksearchindex', to_fields=['rowid']),
+            ),
+            migrations.AddField(
+                model_name='task',
+                name='search_index',
+                field=models.ForeignObject(blank=True, editable=False, from_fields=['id'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='todohan.tasksearchindex', to_fields=['rowid']),
+            ),
+        ]),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:44
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todohan', '0010_search_index_relation'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_status_idx',
+        ),
+    ]
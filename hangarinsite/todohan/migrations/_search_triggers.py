@@ -0,0 +1,42 @@
+"""Helpers for migrations that make SQLite rebuild a todohan table.
+
+SQLite adds most columns by copying the table and renaming the copy. The
+rename fails while any search trigger (0003) still refers to a table that
+was dropped, so the triggers are removed for the rebuild and recreated
+afterwards. The loader skips this module because its name starts with "_".
+"""
+from importlib import import_module
+
+from django.db import migrations
+
+search_index = import_module("todohan.migrations.0003_search_index")
+
+TRIGGER_SQL = [sql for sql in search_index.FORWARD_SQL if sql.startswith("CREATE TRIGGER")]
+DROP_TRIGGER_SQL = [sql for sql in search_index.REVERSE_SQL if sql.startswith("DROP TRIGGER")]
+
+
+def has_search_index(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return False
+    return "todohan_task_fts" in schema_editor.connection.introspection.table_names()
+
+
+def drop_triggers(apps, schema_editor):
+    if has_search_index(schema_editor):
+        for sql in DROP_TRIGGER_SQL:
+            schema_editor.execute(sql)
+
+
+def create_triggers(apps, schema_editor):
+    if has_search_index(schema_editor):
+        for sql in TRIGGER_SQL:
+            schema_editor.execute(sql)
+
+
+def without_search_triggers(*operations):
+    """Wrap schema operations on todohan tables so the search triggers survive them."""
+    return [
+        migrations.RunPython(drop_triggers, create_triggers),
+        *operations,
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
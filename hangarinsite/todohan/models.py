@@ -1,19 +1,60 @@
-from django.db import models
+from django.db import models, router, transaction
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def alive(self):
+        return self.filter(deleted_at__isnull=True)
+
+    def deleted(self):
+        return self.filter(deleted_at__isnull=False)
+
+class AliveManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """Default manager: rows that have not been soft-deleted."""
+    def get_queryset(self):
+        return super().get_queryset().alive()
+
+# Partial index condition: only soft-deleted rows, for purge_deleted
+DELETED = models.Q(deleted_at__isnull=False)
 
 # Create your models here.
 class BaseModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set by todohan.bulk.delete; `manage.py purge_deleted` removes the rows later
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = AliveManager()
+    all_objects = models.Manager.from_queryset(SoftDeleteQuerySet)()
 
     class Meta:
         abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The counter signals compare against these to see what a save changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Counter updates made by post_save commit together with the row
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
 class Priority(BaseModel):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
+    task_count = models.IntegerField(default=0, editable=False)
     
     class Meta:
         verbose_name = "Priority"
         verbose_name_plural = "Priorities"
+        indexes = [
+            models.Index(fields=["name"], name="priority_name_idx"),
+            models.Index(fields=["created_at"], name="priority_created_idx"),
+            models.Index(fields=["updated_at"], name="priority_updated_idx"),
+            models.Index(fields=["deleted_at"], name="priority_deleted_idx", condition=DELETED),
+        ]
 
     def __str__(self):
         return self.name
@@ -21,10 +62,17 @@ class Priority(BaseModel):
 class Category(BaseModel):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
+    task_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = "Category"
         verbose_name_plural = "Categories"
+        indexes = [
+            models.Index(fields=["name"], name="category_name_idx"),
+            models.Index(fields=["created_at"], name="category_created_idx"),
+            models.Index(fields=["updated_at"], name="category_updated_idx"),
+            models.Index(fields=["deleted_at"], name="category_deleted_idx", condition=DELETED),
+        ]
 
     def __str__(self):
         return self.name
@@ -43,14 +91,53 @@ class Task(BaseModel):
     )
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     priority = models.ForeignKey(Priority, on_delete=models.CASCADE)
+    # Maintained by todohan.counters; repair with `manage.py recount`
+    subtask_count = models.IntegerField(default=0, editable=False)
+    completed_subtask_count = models.IntegerField(default=0, editable=False)
+    note_count = models.IntegerField(default=0, editable=False)
+    # The FTS5 row of the same rowid, joined by todohan.search; no column of its own
+    search_index = models.ForeignObject(
+        "TaskSearchIndex", on_delete=models.DO_NOTHING, from_fields=["id"], to_fields=["rowid"],
+        null=True, blank=True, editable=False, related_name="+",
+    )
+
+    class Meta:
+        # TaskListView orders by (sort_by, status, id), or (status, deadline, id)
+        indexes = [
+            models.Index(fields=["deadline", "status"], name="task_deadline_status_idx"),
+            models.Index(fields=["title", "status"], name="task_title_status_idx"),
+            models.Index(fields=["status", "deadline"], name="task_status_deadline_idx"),
+            models.Index(fields=["created_at"], name="task_created_idx"),
+            models.Index(fields=["deleted_at"], name="task_deleted_idx", condition=DELETED),
+            # archive_completed picks the least recently touched completed tasks
+            models.Index(fields=["updated_at"], name="task_completed_idx", condition=models.Q(status="Completed")),
+        ]
 
     def __str__(self):
         return self.title
 
+    @property
+    def progress(self):
+        """Percent of subtasks completed."""
+        if not self.subtask_count:
+            return 0
+        return round(100 * self.completed_subtask_count / self.subtask_count)
+
 class Note(BaseModel):
     id = models.AutoField(primary_key=True)
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
     content = models.TextField()
+    search_index = models.ForeignObject(
+        "NoteSearchIndex", on_delete=models.DO_NOTHING, from_fields=["id"], to_fields=["rowid"],
+        null=True, blank=True, editable=False, related_name="+",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="note_created_idx"),
+            models.Index(fields=["updated_at"], name="note_updated_idx"),
+            models.Index(fields=["deleted_at"], name="note_deleted_idx", condition=DELETED),
+        ]
 
     def __str__(self):
         return self.content
@@ -66,7 +153,162 @@ class SubTask(BaseModel):
     ],
     default="Pending"
     )
+    search_index = models.ForeignObject(
+        "SubTaskSearchIndex", on_delete=models.DO_NOTHING, from_fields=["id"], to_fields=["rowid"],
+        null=True, blank=True, editable=False, related_name="+",
+    )
+
+    class Meta:
+        # SubTaskListView always orders by (sort_by, status, id)
+        indexes = [
+            models.Index(fields=["created_at", "status"], name="subtask_created_status_idx"),
+            models.Index(fields=["updated_at", "status"], name="subtask_updated_status_idx"),
+            models.Index(fields=["title", "status"], name="subtask_title_status_idx"),
+            models.Index(fields=["status"], name="subtask_status_idx"),
+            models.Index(fields=["deleted_at"], name="subtask_deleted_idx", condition=DELETED),
+        ]
+
     def __str__(self):
         return self.title
     
 
+
+class ImportJob(models.Model):
+    """Progress of one `import_tasks` run, committed together with each chunk it imports."""
+    key = models.CharField(max_length=255, unique=True)
+    rows_done = models.PositiveIntegerField(default=0)
+    tasks_created = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.key
+
+
+# Completed tasks moved out of the hot tables by `manage.py archive_completed`.
+# Rows are copied as they were; archived rows are never edited.
+
+class ArchiveModel(models.Model):
+    id = models.AutoField(primary_key=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        abstract = True
+
+
+class ArchivedTask(ArchiveModel):
+    # The id the task had while live; the export writes it out as the task's id
+    original_id = models.IntegerField(db_index=True)
+    title = models.CharField(max_length=128)
+    description = models.CharField(max_length=256)
+    deadline = models.DateTimeField()
+    status = models.CharField(max_length=50)
+    # No constraint, and outer joins: archived tasks outlive the categories and
+    # priorities purged after them
+    category = models.ForeignKey(
+        Category, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name="+",
+    )
+    priority = models.ForeignKey(
+        Priority, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name="+",
+    )
+    subtask_count = models.IntegerField(default=0)
+    completed_subtask_count = models.IntegerField(default=0)
+    note_count = models.IntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["deadline", "status"], name="archivedtask_deadline_idx"),
+            models.Index(fields=["title", "status"], name="archivedtask_title_idx"),
+            models.Index(fields=["archived_at"], name="archivedtask_archived_idx"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    progress = Task.progress
+
+
+class ArchivedNote(ArchiveModel):
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name="note_set")
+    content = models.TextField()
+
+    def __str__(self):
+        return self.content
+
+
+class ArchivedSubTask(ArchiveModel):
+    parent_task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name="subtask_set")
+    title = models.CharField(max_length=128)
+    status = models.CharField(max_length=50)
+
+    def __str__(self):
+        return self.title
+
+
+class SlowQuery(models.Model):
+    """A query slower than TODOHAN_SLOW_QUERY_MS, saved when TODOHAN_SLOW_QUERY_TABLE is on (see todohan.slowqueries)."""
+    recorded_at = models.DateTimeField()
+    view = models.CharField(max_length=200, blank=True)
+    fingerprint = models.CharField(max_length=32)
+    sql = models.TextField()
+    duration = models.FloatField()
+    plan = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name_plural = "Slow queries"
+
+    def __str__(self):
+        return self.sql
+
+
+
+class MatchField(models.TextField):
+    """The hidden column named after an FTS5 table, which MATCH queries the whole row through."""
+
+
+@MatchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", (*lhs_params, *rhs_params)
+
+
+class SearchIndex(models.Model):
+    """A row of one of the FTS5 tables migration 0003 creates; only ever joined, never saved."""
+    rowid = models.IntegerField(primary_key=True)
+    # Only has a value in a query that MATCHes the table
+    rank = models.FloatField()
+
+    class Meta:
+        abstract = True
+
+
+class TaskSearchIndex(SearchIndex):
+    document = MatchField(db_column="todohan_task_fts")
+
+    class Meta:
+        managed = False
+        db_table = "todohan_task_fts"
+
+
+class NoteSearchIndex(SearchIndex):
+    document = MatchField(db_column="todohan_note_fts")
+
+    class Meta:
+        managed = False
+        db_table = "todohan_note_fts"
+
+
+class SubTaskSearchIndex(SearchIndex):
+    document = MatchField(db_column="todohan_subtask_fts")
+
+    class Meta:
+        managed = False
+        db_table = "todohan_subtask_fts"
@@ -0,0 +1,141 @@
+import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_PARAM = "cursor"
+CURSOR_SALT = "todohan.pagination.cursor"
+
+
+def flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def key_value(obj, field):
+    value = obj
+    for part in field.lstrip("-").split("__"):
+        value = getattr(value, part)
+    return value
+
+
+def encode_cursor(keys, values, previous=False):
+    values = [v.isoformat() if isinstance(v, (datetime.date, datetime.datetime)) else v for v in values]
+    return signing.dumps({"k": keys, "v": values, "p": previous}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, keys):
+    # Tampered tokens, or tokens from a different sort order, restart at the first page
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if data.get("k") != keys or len(data.get("v", [])) != len(keys):
+        return None
+    return data
+
+
+def keyset_filter(keys, values, backwards=False):
+    """Rows strictly after ``values`` in ``keys`` order (or before, when going backwards)."""
+    condition = Q()
+    for i, key in enumerate(keys):
+        name = key.lstrip("-")
+        after = key.startswith("-") == backwards
+        step = Q(**{f"{name}__{'gt' if after else 'lt'}": values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            step &= Q(**{prev_key.lstrip("-"): prev_value})
+        condition |= step
+
+    # Redundant range on the leading key so the planner can seek into its index
+    leading = keys[0]
+    after = leading.startswith("-") == backwards
+    return condition & Q(**{f"{leading.lstrip('-')}__{'gte' if after else 'lte'}": values[0]})
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def prepare_cursor_query(queryset, page_size, token=None):
+    """Return ``(queryset, state)``: one page after (or before) ``token``, plus the state to build it."""
+    keys = [str(field) for field in queryset.query.order_by]
+    if not any(key.lstrip("-") in ("id", "pk") for key in keys):
+        keys.append("id")
+    queryset = queryset.order_by(*keys)
+
+    cursor = decode_cursor(token, keys) if token else None
+    backwards = bool(cursor and cursor["p"])
+    if cursor:
+        queryset = queryset.filter(keyset_filter(keys, cursor["v"], backwards))
+    if backwards:
+        queryset = queryset.order_by(*[flip(key) for key in keys])
+    return queryset[:page_size + 1], (keys, cursor, backwards, page_size)
+
+
+def build_cursor_page(rows, state):
+    keys, cursor, backwards, page_size = state
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return CursorPage(rows)
+
+    first = [key_value(rows[0], key) for key in keys]
+    last = [key_value(rows[-1], key) for key in keys]
+    has_next = has_more if not backwards else True
+    has_previous = bool(cursor) if not backwards else has_more
+    return CursorPage(
+        rows,
+        next_cursor=encode_cursor(keys, last) if has_next else None,
+        previous_cursor=encode_cursor(keys, first, previous=True) if has_previous else None,
+    )
+
+
+def paginate_by_cursor(queryset, page_size, token=None):
+    """Fetch one page after (or before) ``token`` without COUNT(*) or OFFSET."""
+    queryset, state = prepare_cursor_query(queryset, page_size, token)
+    return build_cursor_page(list(queryset), state)
+
+
+async def apaginate_by_cursor(queryset, page_size, token=None):
+    queryset, state = prepare_cursor_query(queryset, page_size, token)
+    return build_cursor_page([obj async for obj in queryset], state)
+
+
+class CursorPaginationMixin:
+    """Keyset pagination for ListViews, keyed on the queryset ordering plus ``id``.
+
+    Set ``TODOHAN_PAGINATION_MODE = "offset"`` to fall back to Django's Paginator.
+    """
+    pagination_mode = None
+
+    def get_pagination_mode(self):
+        return self.pagination_mode or getattr(settings, "TODOHAN_PAGINATION_MODE", "cursor")
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.get_pagination_mode() != "cursor":
+            return super().paginate_queryset(queryset, page_size)
+        page = paginate_by_cursor(queryset, page_size, self.request.GET.get(CURSOR_PARAM))
+        return (None, page, page.object_list, page.has_other_pages())
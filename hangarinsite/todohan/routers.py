@@ -0,0 +1,78 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.views.generic.list import ListView
+
+# Only todohan tables are read from replicas; sessions and users always come
+# from the primary so a fresh login is never missing on a lagging replica.
+ROUTED_APPS = {"todohan"}
+
+_state = ContextVar("todohan_routing", default=None)
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.use_replica = False
+        self.pinned = pinned
+        self.wrote = False
+        # Chosen on the first replica read, so the whole request sees one replica's lag
+        self.replica = None
+
+
+@contextmanager
+def request_routing(pinned=False):
+    """Route reads for the duration of one request; yields its RoutingState."""
+    state = RoutingState(pinned)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def get_routing_state():
+    return _state.get()
+
+
+def get_read_replicas():
+    return getattr(settings, "TODOHAN_READ_REPLICAS", [])
+
+
+def reads_from_replica(view_func):
+    view_class = getattr(view_func, "view_class", None)
+    if view_class is None:
+        return False
+    return getattr(view_class, "replica_reads", issubclass(view_class, ListView))
+
+
+class PrimaryReplicaRouter:
+    """Send list-view reads to a read replica and everything else to ``default``.
+
+    A write pins the rest of the request to the primary, so reads that follow
+    it see the change.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        state = _state.get()
+        replicas = get_read_replicas()
+        if state and state.use_replica and not state.pinned and replicas:
+            if state.replica not in replicas:
+                state.replica = random.choice(replicas)
+            return state.replica
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        state = _state.get()
+        if state:
+            state.pinned = state.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so rows from either may be related
+        return True
@@ -0,0 +1,72 @@
+import operator
+from functools import reduce
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, Q
+
+from todohan.models import Task, Note, SubTask
+
+# FTS5 tables created by migration 0003, kept in sync by SQLite triggers;
+# joined through each model's search_index relation
+FTS_TABLES = {
+    Task: "todohan_task_fts",
+    Note: "todohan_note_fts",
+    SubTask: "todohan_subtask_fts",
+}
+
+# The FTS column holding each model field that searches may name
+FTS_COLUMNS = {
+    Task: {"title": "title", "description": "description"},
+    Note: {"content": "content", "task__title": "task_title"},
+    SubTask: {"title": "title", "parent_task__title": "parent_task_title"},
+}
+
+# The trigram tokenizer cannot match anything shorter than three characters
+MIN_QUERY_LENGTH = 3
+
+SEARCH_RANK = "search_rank"
+
+# FTS tables seen per database file; a missing table is looked for again,
+# so a process started before `migrate` turns search on once it has run
+_found_tables = {}
+
+
+def fts_enabled(model, using=DEFAULT_DB_ALIAS):
+    table = FTS_TABLES.get(model)
+    connection = connections[using]
+    if table is None or connection.vendor != "sqlite":
+        return False
+    found = _found_tables.setdefault(connection.settings_dict["NAME"], set())
+    if table not in found:
+        found.update(set(FTS_TABLES.values()) & set(connection.introspection.table_names()))
+    return table in found
+
+
+def fts_columns(model, fields):
+    """The FTS columns for ``fields``, or None when one of them isn't indexed."""
+    columns = [FTS_COLUMNS.get(model, {}).get(field) for field in fields]
+    return columns if columns and all(columns) else None
+
+
+def match_expression(query, columns):
+    # Quote the whole query as a single phrase so it matches like icontains,
+    # and only in the columns searched
+    return '{{{}}} : "{}"'.format(" ".join(columns), query.replace('"', '""'))
+
+
+def search(queryset, query, fields):
+    """Filter ``queryset`` by ``query``, ranked by relevance when FTS5 is available."""
+    query = query.strip()
+    model = queryset.model
+    columns = fts_columns(model, fields)
+    if columns and fts_enabled(model, queryset.db) and len(query) >= MIN_QUERY_LENGTH:
+        # One join on the FTS table: MATCH runs once and rank comes from the same rows
+        return queryset.filter(search_index__document__match=match_expression(query, columns)).annotate(**{
+            SEARCH_RANK: F("search_index__rank")
+        })
+
+    return queryset.filter(reduce(operator.or_, (Q(**{f"{field}__icontains": query}) for field in fields)))
+
+
+def is_ranked(queryset):
+    return SEARCH_RANK in queryset.query.annotations
@@ -0,0 +1,35 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from todohan import counters, lookups, slowqueries
+from todohan.caching import bump_generation
+from todohan.db import apply_sqlite_pragmas
+from todohan.models import Priority, Category, Task, Note, SubTask
+
+
+def invalidate_cached_pages(sender, **kwargs):
+    # Cached pages and the dashboard snapshot are keyed on these generations
+    bump_generation(sender)
+
+
+for model in (Priority, Category, Task, Note, SubTask):
+    post_save.connect(invalidate_cached_pages, sender=model, dispatch_uid=f"generation-save-{model.__name__}")
+    post_delete.connect(invalidate_cached_pages, sender=model, dispatch_uid=f"generation-delete-{model.__name__}")
+
+# Category and Priority rows cached in each process by todohan.lookups
+for model in lookups.LOOKUP_MODELS:
+    post_save.connect(lookups.invalidate, sender=model, dispatch_uid=f"lookups-save-{model.__name__}")
+    post_delete.connect(lookups.invalidate, sender=model, dispatch_uid=f"lookups-delete-{model.__name__}")
+
+# Denormalized counters on Task, Category and Priority
+for model, saved, deleted in [
+    (Task, counters.task_saved, counters.task_deleted),
+    (Note, counters.note_saved, counters.note_deleted),
+    (SubTask, counters.subtask_saved, counters.subtask_deleted),
+]:
+    pre_save.connect(counters.snapshot, sender=model, dispatch_uid=f"counters-snapshot-{model.__name__}")
+    post_save.connect(saved, sender=model, dispatch_uid=f"counters-save-{model.__name__}")
+    post_delete.connect(deleted, sender=model, dispatch_uid=f"counters-delete-{model.__name__}")
+
+connection_created.connect(apply_sqlite_pragmas, dispatch_uid="sqlite-pragmas")
+connection_created.connect(slowqueries.install, dispatch_uid="slow-queries")
@@ -0,0 +1,165 @@
+"""Slow-query log with the plan SQLite chose for each query.
+
+RECORDER is an execute_wrapper installed on every connection (see
+todohan.signals). Queries slower than ``TODOHAN_SLOW_QUERY_MS`` are
+explained with EXPLAIN QUERY PLAN on a separate cursor and kept, with the
+view that ran them, in a per-process ring buffer of
+``TODOHAN_SLOW_QUERY_LOG_SIZE`` entries. With ``TODOHAN_SLOW_QUERY_TABLE``
+on, SlowQueryMiddleware also saves each request's entries to the SlowQuery
+table so every process's queries show up at /admin/slow-queries/.
+
+The time measured is until the first row is ready, which includes any sort
+or temporary B-tree SQLite builds, but not fetching the remaining rows.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils import timezone
+
+from todohan.models import SlowQuery
+
+# The view whose request is running; set by todohan.middleware.SlowQueryMiddleware
+current_view = ContextVar("todohan_slow_query_view", default="")
+# Entries of the current request still to be saved to the SlowQuery table
+pending = ContextVar("todohan_slow_query_pending", default=None)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+WHITESPACE_RE = re.compile(r"\s+")
+# SEARCH seeks with an index; SCAN reads every row, even "SCAN t USING INDEX i"
+# (which only gets the order from the index)
+FULL_SCAN_RE = re.compile(r"^\s*SCAN (?!CONSTANT ROW)", re.MULTILINE)
+
+
+def get_threshold():
+    return getattr(settings, "TODOHAN_SLOW_QUERY_MS", 100) / 1000
+
+
+def normalize(sql):
+    """``sql`` with literals and parameter lists folded, so queries differing only in values match."""
+    sql = STRING_RE.sub("?", sql)
+    sql = NUMBER_RE.sub("?", sql.replace("%s", "?"))
+    sql = IN_LIST_RE.sub("IN (...)", sql)
+    return WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()
+
+
+def explain(connection, sql, params):
+    """EXPLAIN QUERY PLAN output as an indented tree, or "" where it can't be had."""
+    if connection.vendor != "sqlite":
+        return ""
+    # A cursor of its own, outside the execute wrappers, so the query's results are untouched
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        rows = cursor.fetchall()
+    except connection.Database.Error:
+        return ""
+    finally:
+        cursor.close()
+    depth, lines = {}, []
+    for id, parent, _, detail in rows:
+        depth[id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[id] + detail)
+    return "\n".join(lines)
+
+
+class SlowQueryRecorder:
+
+    def __init__(self, size):
+        self.entries = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        seconds = time.perf_counter() - started
+        if seconds >= get_threshold() and not many and SlowQuery._meta.db_table not in sql:
+            self.record(context["connection"], sql, params, seconds)
+        return result
+
+    def record(self, connection, sql, params, seconds):
+        entry = {
+            "recorded_at": timezone.now(),
+            "view": current_view.get(),
+            "fingerprint": fingerprint(sql),
+            "sql": sql,
+            "duration": seconds,
+            "plan": explain(connection, sql, params),
+        }
+        with self.lock:
+            self.entries.append(entry)
+        requests = pending.get()
+        if requests is not None:
+            requests.append(entry)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+RECORDER = SlowQueryRecorder(getattr(settings, "TODOHAN_SLOW_QUERY_LOG_SIZE", 200))
+
+
+def install(sender, connection, **kwargs):
+    """connection_created hook; the wrapper list outlives reconnects, so add it once.
+
+    It goes first in the list: a connection may open inside a request, with
+    the middlewares' execute_wrapper() contexts already pushed, and those pop
+    whatever is last when they exit.
+    """
+    if RECORDER not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, RECORDER)
+
+
+def table_enabled():
+    return getattr(settings, "TODOHAN_SLOW_QUERY_TABLE", False)
+
+
+def save(entries):
+    """Store ``entries`` in the SlowQuery table, keeping only the latest log-size rows."""
+    rows = SlowQuery.objects.bulk_create([SlowQuery(**entry) for entry in entries])
+    size = RECORDER.entries.maxlen
+    SlowQuery.objects.filter(pk__lte=rows[-1].pk - size).delete()
+
+
+def get_entries():
+    if table_enabled():
+        return list(SlowQuery.objects.order_by("-pk").values()[:RECORDER.entries.maxlen])
+    return RECORDER.snapshot()
+
+
+def group(entries):
+    """One row per fingerprint, the costliest in total first, with the plan of its slowest run."""
+    groups = {}
+    for entry in entries:
+        row = groups.get(entry["fingerprint"])
+        if row is None:
+            row = groups[entry["fingerprint"]] = {
+                "fingerprint": entry["fingerprint"], "sql": normalize(entry["sql"]), "count": 0, "total": 0.0,
+                "slowest": entry, "views": set(), "last_seen": entry["recorded_at"],
+            }
+        row["count"] += 1
+        row["total"] += entry["duration"]
+        row["views"].add(entry["view"] or "-")
+        row["last_seen"] = max(row["last_seen"], entry["recorded_at"])
+        if entry["duration"] > row["slowest"]["duration"]:
+            row["slowest"] = entry
+    for row in groups.values():
+        row["average"] = row["total"] / row["count"]
+        row["views"] = sorted(row["views"])
+        row["full_scan"] = bool(FULL_SCAN_RE.search(row["slowest"]["plan"]))
+    return sorted(groups.values(), key=lambda row: row["total"], reverse=True)
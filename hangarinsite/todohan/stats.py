@@ -0,0 +1,90 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+
+from todohan.caching import get_generations
+from todohan.models import Priority, Task, Note, SubTask, Category
+
+STATS_MODELS = (Priority, Category, Task, Note, SubTask)
+STATS_KEY = "todohan:stats:{generations}"
+STATS_TIMEOUT = 60 * 60 * 24
+
+
+def compute_counters():
+    # All dashboard counters in a single round-trip; soft-deleted rows don't count
+    sql = (
+        "SELECT "
+        "(SELECT COUNT(*) FROM {task} WHERE deleted_at IS NULL), "
+        "(SELECT COUNT(*) FROM {task} WHERE deleted_at IS NULL AND status = %s), "
+        "(SELECT COUNT(*) FROM {note} WHERE deleted_at IS NULL), "
+        "(SELECT COUNT(*) FROM {subtask} WHERE deleted_at IS NULL), "
+        "(SELECT COUNT(*) FROM {priority} WHERE deleted_at IS NULL), "
+        "(SELECT COUNT(*) FROM {category} WHERE deleted_at IS NULL)"
+    ).format(
+        task=Task._meta.db_table,
+        note=Note._meta.db_table,
+        subtask=SubTask._meta.db_table,
+        priority=Priority._meta.db_table,
+        category=Category._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ["Completed"])
+        total, completed, notes, subtasks, priorities, categories = cursor.fetchone()
+
+    return {
+        "total_tasks": total,
+        "completed_tasks": completed,
+        "pending_tasks": total - completed,
+        "total_notes": notes,
+        "total_subtasks": subtasks,
+        "total_priorities": priorities,
+        "total_categories": categories,
+    }
+
+
+def top_by_task_count(model, limit=3):
+    # task_count is a maintained counter, so no join or GROUP BY
+    return list(model.objects.order_by("-task_count").values("id", "name", "task_count")[:limit])
+
+
+async def atop_by_task_count(model, limit=3):
+    queryset = model.objects.order_by("-task_count").values("id", "name", "task_count")[:limit]
+    return [row async for row in queryset]
+
+
+def compute_stats():
+    stats = compute_counters()
+    stats["top_priorities"] = top_by_task_count(Priority)
+    stats["top_categories"] = top_by_task_count(Category)
+    return stats
+
+
+def get_dashboard_stats():
+    key = STATS_KEY.format(generations=".".join(str(g) for g in get_generations(STATS_MODELS)))
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats()
+        cache.set(key, stats, STATS_TIMEOUT)
+    return stats
+
+
+async def acompute_stats():
+    # The counters and both top-3 lists are independent, so run them together
+    counters, top_priorities, top_categories = await asyncio.gather(
+        sync_to_async(compute_counters)(),
+        atop_by_task_count(Priority),
+        atop_by_task_count(Category),
+    )
+    return {**counters, "top_priorities": top_priorities, "top_categories": top_categories}
+
+
+async def aget_dashboard_stats():
+    generations = await sync_to_async(get_generations)(STATS_MODELS)
+    key = STATS_KEY.format(generations=".".join(str(g) for g in generations))
+    stats = await cache.aget(key)
+    if stats is None:
+        stats = await acompute_stats()
+        await cache.aset(key, stats, STATS_TIMEOUT)
+    return stats
@@ -0,0 +1,65 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".map", ".svg", ".json", ".txt", ".html", ".xml", ".ico", ".eot", ".ttf", ".otf"}
+
+# Variants that don't save at least this much are not worth a second file
+MIN_SAVING = 0.05
+
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+def compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+def compress_file(path):
+    """Write ``path.gz`` (and ``path.br``) next to ``path``; return the suffixes written."""
+    with open(path, "rb") as f:
+        data = f.read()
+    written = []
+    for suffix, compress in compressors():
+        compressed = compress(data)
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+            written.append(suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Content-hashed filenames plus gzip/brotli variants, built by collectstatic."""
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert(matchobj):
+            # The vendored bundles point at source maps that aren't shipped; keep those references as they are
+            try:
+                return converter(matchobj)
+            except ValueError:
+                return matchobj.group(0)
+
+        return convert
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        # Compress the hashed copies and the originals, which some pages still link to
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            for suffix in compress_file(self.path(name)):
+                yield name, name + suffix, True
@@ -1,3 +1,1318 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.http import FileResponse, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.http import http_date
+
+from todohan import bulk, metrics, slowqueries
+from todohan import search as search_module
+from todohan.caching import page_cache_stats
+from todohan.db import read_sqlite_pragmas, pragmas_match
+from todohan.middleware import get_query_budget, QueryCounter, ReplicaRoutingMiddleware, PRIMARY_COOKIE
+from todohan.middleware import StaticFilesMiddleware, IMMUTABLE_CACHE_CONTROL, STATIC_CACHE_CONTROL
+from todohan.models import Priority, Category, Task, Note, SubTask, ImportJob, ArchivedTask, ArchivedNote, SlowQuery
+from todohan.archive import archive_completed
+from todohan.routers import PrimaryReplicaRouter
+from todohan.stats import top_by_task_count
+from todohan.lookups import LOOKUP_MODELS, get_lookup
+from todohan.export import export_queryset, task_records
+from todohan.importer import import_tasks
+from todohan.pagination import paginate_by_cursor
+from todohan.search import search, is_ranked, SEARCH_RANK
+from todohan.forms import TaskForm
+from todohan.views import HomePageView, TaskListView, TaskUpdateView
+
+# Tests get a cache of their own; the configured one is shared with running servers
+TEST_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TodohanTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("tester", password="secret")
+        cls.categories = [Category.objects.create(name=f"Category {i}") for i in range(3)]
+        cls.priorities = [Priority.objects.create(name=f"Priority {i}") for i in range(3)]
+        now = timezone.now()
+        cls.tasks = []
+        for i in range(12):
+            task = Task.objects.create(
+                title=f"Task {i:02}",
+                description=f"Description {i}",
+                deadline=now + timedelta(days=i % 4),
+                status=["Pending", "In Progress", "Completed"][i % 3],
+                category=cls.categories[i % 3],
+                priority=cls.priorities[i % 3],
+            )
+            Note.objects.create(task=task, content=f"Note for task {i}")
+            SubTask.objects.create(parent_task=task, title=f"Subtask {i}", status=task.status)
+            cls.tasks.append(task)
+
+    def setUp(self):
+        cache.clear()
+        # Start from the steady state, where each process already holds the lookup tables
+        for model in LOOKUP_MODELS:
+            get_lookup(model)
+        self.client.force_login(self.user)
+
+
+class QueryBudgetTestMixin:
+    """Fail when a GET runs more SQL queries than its view's ``query_budget``."""
+
+    def assertWithinQueryBudget(self, url, cold=False):
+        budget = get_query_budget(resolve(url.split("?")[0]).func)
+        self.assertIsNotNone(budget, f"{url} does not declare a query_budget")
+        if cold:
+            # Nothing cached: the page is rendered, the lookups reloaded and
+            # the FTS tables looked up, as on a fresh process
+            cache.clear()
+            search_module._found_tables.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(ctx), budget,
+            f"{url} ran {len(ctx)} queries (budget {budget}):\n" + "\n".join(q["sql"] for q in ctx),
+        )
+        return response
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TodohanTestCase):
+
+    def test_list_views_within_budget(self):
+        urls = [
+            "/",
+            "/task_list",
+            "/task_list?sort_by=category__name",
+            "/task_list?sort_by=priority__name",
+            "/task_list?q=Task",
+            "/notes/",
+            "/notes/?q=task",
+            "/subtasks/",
+            "/subtasks/?q=Subtask",
+            "/categories/",
+            "/priorities/",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(url)
+
+    def test_form_views_within_budget(self):
+        task, note, subtask = self.tasks[0], Note.objects.first(), SubTask.objects.first()
+        urls = [
+            "/task_list/add",
+            f"/task_list/{task.pk}",
+            f"/task_list/{task.pk}/delete",
+            "/notes/add/",
+            f"/notes/{note.pk}/edit/",
+            f"/notes/{note.pk}/delete/",
+            "/subtasks/add/",
+            f"/subtasks/{subtask.pk}/edit/",
+            f"/subtasks/{subtask.pk}/delete/",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(url)
+
+    def test_budgets_hold_on_a_cold_cache(self):
+        task = self.tasks[0]
+        urls = [
+            "/", "/task_list", "/task_list?q=Task", "/task_list/archive", "/notes/", "/notes/?q=task",
+            "/subtasks/", "/subtasks/?q=Subtask", "/async/task_list?q=Task", "/api/tasks/?q=Task",
+            "/task_list/export.csv?q=Task", "/task_list/add", f"/task_list/{task.pk}", f"/task_list/{task.pk}/delete",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(url, cold=True)
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as before:
+            self.client.get("/notes/")
+        for task in self.tasks:
+            Note.objects.create(task=task, content="Another note")
+        with CaptureQueriesContext(connection) as after:
+            self.client.get("/notes/")
+        self.assertEqual(len(before), len(after))
+
+    def test_middleware_logs_views_over_budget(self):
+        with mock.patch.object(TaskListView, "query_budget", 0), \
+                self.assertLogs("todohan.querybudget", level="WARNING") as logs:
+            self.client.get("/task_list")
+        self.assertIn("task-list", logs.output[0])
+
+
+class IndexUsageTests(TodohanTestCase):
+    # Sorting on a joined column (category__name, task__title, ...) always needs a
+    # sort step because the (sort_by, status, id) key spans two tables.
+    INDEXED_SORTS = {
+        "/task_list": ["deadline", "title", "status"],
+        "/notes/": ["created_at", "updated_at"],
+        "/subtasks/": ["created_at", "updated_at", "title", "status"],
+        "/categories/": ["name", "created_at", "updated_at"],
+        "/priorities/": ["name", "created_at", "updated_at"],
+    }
+
+    def page_query_plan(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        # Cursor pages fetch paginate_by + 1 rows
+        sql = next(q["sql"] for q in ctx if q["sql"].endswith("LIMIT 7"))
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+        return response, plan
+
+    def assertIndexedPlan(self, plan):
+        self.assertIn("INDEX", plan[0], plan)
+        self.assertFalse(any("TEMP B-TREE" in step for step in plan), plan)
+
+    def test_list_views_sort_using_an_index(self):
+        for url, sorts in self.INDEXED_SORTS.items():
+            for sort_by in sorts:
+                with self.subTest(url=url, sort_by=sort_by):
+                    response, plan = self.page_query_plan(url, sort_by=sort_by)
+                    self.assertIndexedPlan(plan)
+
+                    # Later cursor pages seek into the same index
+                    cursor = response.context["page_obj"].next_cursor
+                    if cursor:
+                        _, plan = self.page_query_plan(url, sort_by=sort_by, cursor=cursor)
+                        self.assertIndexedPlan(plan)
+
+    def test_recent_tasks_use_created_at_index(self):
+        plan = Task.objects.order_by("-created_at")[:5].explain()
+        self.assertIn("task_created_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class PaginationTests(TodohanTestCase):
+
+    def walk(self, queryset, page_size):
+        pages, token = [], None
+        while True:
+            page = paginate_by_cursor(queryset, page_size, token)
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            token = page.next_cursor
+
+    def test_pages_walk_both_ways_across_equal_sort_values(self):
+        # Four tasks share each status, so pages of five split runs of equal values
+        queryset = Task.objects.order_by("status")
+        pages = self.walk(queryset, 5)
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        self.assertEqual([task for page in pages for task in page], list(queryset.order_by("status", "id")))
+        self.assertFalse(pages[0].has_previous())
+
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = paginate_by_cursor(queryset, 5, page.previous_cursor)
+            self.assertEqual(page.object_list, expected.object_list)
+        self.assertFalse(page.has_previous())
+
+    def test_view_pages_follow_cursors(self):
+        first = self.client.get("/task_list", {"sort_by": "status"}).context["page_obj"]
+        second = self.client.get("/task_list", {"sort_by": "status", "cursor": first.next_cursor}).context["page_obj"]
+        self.assertEqual(
+            [task.pk for task in [*first, *second]], list(Task.objects.order_by("status", "deadline", "id").values_list("pk", flat=True))
+        )
+        back = self.client.get("/task_list", {"sort_by": "status", "cursor": second.previous_cursor}).context["page_obj"]
+        self.assertEqual(back.object_list, first.object_list)
+
+    def test_bad_cursors_restart_at_the_first_page(self):
+        token = self.client.get("/task_list").context["page_obj"].next_cursor
+        for params in (
+            {"cursor": token[:-2] + ("AA" if token[-2:] != "AA" else "BB")},
+            {"cursor": "not-a-cursor"},
+            # Signed for the deadline order, not the title order
+            {"cursor": token, "sort_by": "title"},
+        ):
+            page = self.client.get("/task_list", params).context["page_obj"]
+            first_page = Task.objects.order_by(params.get("sort_by", "deadline"), "status", "id")[:6]
+            self.assertEqual(page.object_list, list(first_page))
+            self.assertFalse(page.has_previous())
+
+    @override_settings(TODOHAN_PAGINATION_MODE="offset")
+    def test_offset_mode_uses_numbered_pages(self):
+        response = self.client.get("/task_list", {"page": 2})
+        page = response.context["page_obj"]
+        self.assertEqual(page.number, 2)
+        self.assertEqual(page.paginator.count, 12)
+        self.assertEqual(len(response.context["tasks"]), 6)
+        self.assertFalse(page.has_next())
+
+
+class SearchTests(TodohanTestCase):
+
+    def test_matches_are_ranked_from_one_join(self):
+        dense = Task.objects.create(
+            title="Zebra zebra", description="zebra", deadline=timezone.now(),
+            category=self.categories[0], priority=self.priorities[0],
+        )
+        sparse = Task.objects.create(
+            title="Zebra crossing", description="A much longer description of a road", deadline=timezone.now(),
+            category=self.categories[0], priority=self.priorities[0],
+        )
+        qs = search(Task.objects.all(), "zebra", ["title", "description"])
+        self.assertTrue(is_ranked(qs))
+        self.assertEqual(str(qs.query).count("MATCH"), 1)
+        self.assertEqual(list(qs.order_by(SEARCH_RANK)), [dense, sparse])
+        self.assertEqual(self.client.get("/task_list?q=zebra").context["tasks"][0], dense)
+
+    def test_short_queries_fall_back_to_icontains(self):
+        qs = search(Task.objects.all(), " 1 ", ["title", "description"])
+        self.assertFalse(is_ranked(qs))
+        self.assertNotIn("MATCH", str(qs.query))
+        self.assertEqual(set(qs), {self.tasks[1], self.tasks[10], self.tasks[11]})
+
+    def test_index_created_after_start_is_picked_up(self):
+        with mock.patch.dict(search_module._found_tables, clear=True):
+            # As in a process started before `migrate` created the FTS tables
+            with mock.patch.object(connection.introspection, "table_names", return_value=["todohan_task"]):
+                self.assertFalse(is_ranked(search(Task.objects.all(), "Task", ["title"])))
+            self.assertTrue(is_ranked(search(Task.objects.all(), "Task", ["title"])))
+
+    def test_only_the_searched_columns_match(self):
+        # Subtask titles are "Subtask <n>", their parent tasks' "Task <nn>"
+        self.assertFalse(search(SubTask.objects.all(), "Task 03", ["title"]).exists())
+        self.assertEqual(
+            list(search(SubTask.objects.all(), "Task 03", ["title", "parent_task__title"])),
+            list(self.tasks[3].subtask_set.all()),
+        )
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get("/admin/todohan/subtask/", {"q": "Task 03"})
+        self.assertEqual(list(response.context["cl"].result_list), [])
+        response = self.client.get("/admin/todohan/note/", {"q": "Note for task 3"})
+        self.assertEqual(list(response.context["cl"].result_list), list(self.tasks[3].note_set.all()))
+
+    def test_triggers_keep_the_index_in_sync(self):
+        task = self.tasks[4]
+        task.title = "Renamed errand"
+        task.save()
+        self.assertEqual(list(search(Task.objects.all(), "errand", ["title"])), [task])
+        self.assertFalse(search(Task.objects.all(), "Task 04", ["title"]).exists())
+        # Notes and subtasks are searched by their task's title too
+        notes = search(Note.objects.all(), "errand", ["content", "task__title"])
+        self.assertEqual(list(notes), list(task.note_set.all()))
+        subtasks = search(SubTask.objects.all(), "errand", ["title", "parent_task__title"])
+        self.assertEqual(list(subtasks), list(task.subtask_set.all()))
+
+        task.delete()
+        self.assertFalse(search(Task.all_objects.all(), "errand", ["title"]).exists())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM todohan_note_fts WHERE rowid NOT IN (SELECT id FROM todohan_note)")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class BatchAPITests(TodohanTestCase):
+
+    def post_batch(self, url, payload):
+        return self.client.post(url, json.dumps(payload), content_type="application/json")
+
+    def task_payload(self, title, **extra):
+        return {
+            "title": title,
+            "description": "From the API",
+            "deadline": "2030-01-01T09:00:00",
+            "status": "Pending",
+            "category": self.categories[0].pk,
+            "priority": self.priorities[0].pk,
+            **extra,
+        }
+
+    def test_update_timestamps_are_taken_inside_the_write_transaction(self):
+        depth = len(connection.atomic_blocks)
+        taken_at = []
+
+        def now():
+            taken_at.append(len(connection.atomic_blocks))
+            return timezone.now()
+
+        with mock.patch("todohan.api.timezone", wraps=timezone) as api_timezone:
+            api_timezone.now.side_effect = now
+            response = self.post_batch("/api/tasks/batch/", {"update": [{"id": self.tasks[0].pk, "status": "Completed"}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(taken_at)
+        self.assertTrue(all(blocks > depth for blocks in taken_at), taken_at)
+
+    def test_create_update_delete_in_one_batch(self):
+        doomed = self.tasks[-1]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_batch("/api/tasks/batch/", {
+                "create": [self.task_payload(f"API task {i}") for i in range(50)],
+                "update": [{"id": self.tasks[0].pk, "status": "Completed"}],
+                "delete": [doomed.pk],
+            })
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body["create"]), 50)
+        self.assertTrue(all(item["ok"] and item["id"] for item in body["create"]))
+        self.assertEqual(Task.objects.filter(title__startswith="API task").count(), 50)
+        self.assertEqual(Task.objects.get(pk=self.tasks[0].pk).status, "Completed")
+        self.assertFalse(Task.objects.filter(pk=doomed.pk).exists())
+        # Query count does not depend on the number of created items
+        self.assertLess(len(ctx), 30)
+
+    def test_invalid_item_rejects_whole_batch(self):
+        response = self.post_batch("/api/tasks/batch/", {
+            "create": [
+                self.task_payload("Valid"),
+                self.task_payload("Bad", status="Nope", category=999999),
+            ],
+        })
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["create"][1]["errors"]
+        self.assertIn("status", errors)
+        self.assertIn("category", errors)
+        self.assertFalse(Task.objects.filter(title="Valid").exists())
+
+    def test_subtask_and_note_batches(self):
+        task = self.tasks[0]
+        response = self.post_batch("/api/subtasks/batch/", {
+            "create": [{"parent_task": task.pk, "title": "From API"}],
+        })
+        self.assertEqual(response.status_code, 200)
+        response = self.post_batch("/api/notes/batch/", {
+            "create": [{"task": task.pk, "content": "From API"}],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Note.objects.filter(task=task, content="From API").exists())
+
+    def test_list_endpoint_uses_view_sort_and_search(self):
+        response = self.client.get("/api/tasks/", {"sort_by": "title", "page_size": 5})
+        body = response.json()
+        self.assertEqual([t["title"] for t in body["results"]], [f"Task {i:02}" for i in range(5)])
+        self.assertIsNotNone(body["next"])
+
+        response = self.client.get("/api/tasks/", {"q": "Task 07"})
+        self.assertEqual([t["title"] for t in response.json()["results"]], ["Task 07"])
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get("/api/tasks/")
+        self.assertEqual(response.status_code, 401)
+
+
+class PageCacheTests(TodohanTestCase):
+
+    def test_repeat_request_is_served_from_cache(self):
+        self.client.get("/task_list")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/task_list")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("todohan_task" in q["sql"] for q in ctx))
+        self.assertEqual(page_cache_stats()["hits"], 1)
+
+    def test_saving_a_related_model_invalidates_the_page(self):
+        self.client.get("/task_list", {"sort_by": "category__name"})
+        category = self.categories[0]
+        category.name = "A renamed category"
+        category.save()
+        response = self.client.get("/task_list", {"sort_by": "category__name"})
+        self.assertEqual(response.context["tasks"][0].category.name, "A renamed category")
+        self.assertEqual(page_cache_stats()["misses"], 2)
+
+    def test_unrelated_model_keeps_the_page_cached(self):
+        self.client.get("/priorities/")
+        Note.objects.create(task=self.tasks[0], content="Unrelated")
+        self.client.get("/priorities/")
+        self.assertEqual(page_cache_stats()["hits"], 1)
+
+    def test_dashboard_is_refreshed_after_changes(self):
+        response = self.client.get("/")
+        self.assertEqual(response.context["total_tasks"], 12)
+        self.tasks[0].delete()
+        response = self.client.get("/")
+        self.assertEqual(response.context["total_tasks"], 11)
+
+
+class ConditionalGetTests(TodohanTestCase):
+
+    def test_matching_etag_returns_304_without_rendering(self):
+        response = self.client.get("/task_list")
+        etag = response.headers["ETag"]
+        self.assertNotIn("Last-Modified", response.headers)
+
+        cache.clear()
+        with self.assertTemplateNotUsed("task_list.html"):
+            response = self.client.get("/task_list", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+
+    def test_etag_is_stable_across_requests(self):
+        with mock.patch("time.time", return_value=1_700_000_000):
+            etag = self.client.get("/task_list").headers["ETag"]
+        cache.clear()
+        with mock.patch("time.time", return_value=1_700_000_100):
+            response = self.client.get("/task_list", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_when_visible_rows_change(self):
+        for url, change in [
+            ("/task_list", lambda: Task.objects.filter(pk=self.tasks[1].pk).update(updated_at=timezone.now())),
+            ("/notes/", lambda: self.tasks[0].save()),
+            ("/", lambda: Note.objects.create(task=self.tasks[0], content="New note")),
+        ]:
+            with self.subTest(url=url):
+                etag = self.client.get(url).headers["ETag"]
+                change()
+                cache.clear()
+                response = self.client.get(url, headers={"if-none-match": etag})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_row_leaving_the_page_is_not_answered_from_a_stale_date(self):
+        self.client.get("/task_list", {"sort_by": "title"})
+        bulk.delete(Task, [self.tasks[0].pk])
+        cache.clear()
+        # Every row still on the page is older than this
+        response = self.client.get("/task_list", {"sort_by": "title"}, headers={"if-modified-since": http_date()})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(self.tasks[0], response.context["tasks"])
+
+    def test_renamed_category_changes_task_list_etag(self):
+        etag = self.client.get("/task_list").headers["ETag"]
+        self.categories[1].save()
+        response = self.client.get("/task_list", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+
+class AsyncViewTests(TodohanTestCase):
+
+    def test_async_lists_match_sync_lists(self):
+        for sync_url, async_url, name in [
+            ("/", "/async/", "recent_tasks"),
+            ("/task_list", "/async/task_list", "tasks"),
+            ("/task_list?q=Task 03", "/async/task_list?q=Task 03", "tasks"),
+            ("/notes/?sort_by=task__title", "/async/notes/?sort_by=task__title", "notes"),
+            ("/subtasks/", "/async/subtasks/", "subtasks"),
+            ("/categories/", "/async/categories/", "categories"),
+            ("/priorities/", "/async/priorities/", "priorities"),
+        ]:
+            with self.subTest(url=async_url):
+                expected = self.client.get(sync_url).context
+                response = self.client.get(async_url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([o.pk for o in response.context[name]], [o.pk for o in expected[name]])
+                self.assertIn("ETag", response.headers)
+
+    def test_async_dashboard_stats(self):
+        response = self.client.get("/async/")
+        self.assertEqual(response.context["total_tasks"], 12)
+        self.assertEqual(response.context["completed_tasks"], 4)
+        self.assertEqual(len(response.context["top_categories"]), 3)
+
+    def test_async_cursor_pages(self):
+        first = self.client.get("/async/task_list").context["page_obj"]
+        second = self.client.get("/async/task_list", {"cursor": first.next_cursor}).context["page_obj"]
+        self.assertEqual(len(first) + len(second), 12)
+        self.assertFalse(second.has_next())
+
+    def test_async_create_update_delete(self):
+        response = self.client.post("/async/categories/add/", {"name": "Async category"})
+        self.assertRedirects(response, "/async/categories/")
+        category = Category.objects.get(name="Async category")
+
+        response = self.client.post(f"/async/categories/{category.pk}/edit/", {"name": ""})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors)
+
+        self.client.post(f"/async/categories/{category.pk}/edit/", {"name": "Renamed"})
+        category.refresh_from_db()
+        self.assertEqual(category.name, "Renamed")
+
+        self.client.post(f"/async/categories/{category.pk}/delete/")
+        self.assertFalse(Category.objects.filter(pk=category.pk).exists())
+        self.assertEqual(self.client.get("/async/categories/999/edit/").status_code, 404)
+
+    async def test_async_client(self):
+        response = await self.async_client.get("/async/task_list")
+        self.assertEqual(response.status_code, 302)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get("/async/task_list")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["tasks"]), 6)
+
+
+class DatabaseProfileTests(TodohanTestCase):
+
+    def test_connections_use_tuned_pragmas(self):
+        pragmas = read_sqlite_pragmas(connection)
+        self.assertEqual(pragmas["synchronous"], "normal")
+        self.assertEqual(pragmas["temp_store"], "memory")
+        self.assertEqual(pragmas["busy_timeout"], 5000)
+        self.assertEqual(pragmas["cache_size"], -64000)
+
+    def test_health_check_reports_pragmas(self):
+        self.client.logout()
+        response = self.client.get("/health/db/")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["vendor"], "sqlite")
+        self.assertEqual(data["conn_max_age"], 600)
+        self.assertEqual(data["pragmas"]["busy_timeout"], 5000)
+        # The in-memory test database cannot use WAL
+        self.assertEqual(data["pragmas"]["journal_mode"], "memory")
+        self.assertEqual(data["status"], "degraded")
+
+    def test_health_check_matches_expected_values(self):
+        expected = {"journal_mode": "wal", "synchronous": "normal"}
+        self.assertTrue(pragmas_match(expected, {"journal_mode": "WAL", "synchronous": "normal"}))
+        self.assertFalse(pragmas_match(expected, {"journal_mode": "delete", "synchronous": "normal"}))
+
+
+@override_settings(TODOHAN_READ_REPLICAS=["replica"])
+class ReplicaRoutingTests(TodohanTestCase):
+
+    def route(self, view, method="GET", cookies=None, write=False):
+        """Run a request through ReplicaRoutingMiddleware and record where Task reads go."""
+        seen = {}
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            seen["before"] = Task.objects.all().db
+            if write:
+                Category.objects.create(name="Written")
+            seen["after"] = Task.objects.all().db
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        request = RequestFactory().generic(method, "/")
+        request.COOKIES.update(cookies or {})
+        response = middleware(request)
+        return seen, response
+
+    def test_list_views_read_from_replica(self):
+        for view in (TaskListView.as_view(), HomePageView.as_view()):
+            seen, _ = self.route(view)
+            self.assertEqual(seen["before"], "replica")
+
+    def test_other_views_and_apps_use_primary(self):
+        seen, _ = self.route(TaskUpdateView.as_view())
+        self.assertEqual(seen["before"], "default")
+        seen, _ = self.route(TaskListView.as_view(), method="POST")
+        self.assertEqual(seen["before"], "default")
+        self.assertIsNone(PrimaryReplicaRouter().db_for_read(User))
+
+    def test_reads_after_a_write_stick_to_primary(self):
+        seen, response = self.route(TaskListView.as_view(), write=True)
+        self.assertEqual((seen["before"], seen["after"]), ("replica", "default"))
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+        seen, _ = self.route(TaskListView.as_view(), cookies={PRIMARY_COOKIE: "1"})
+        self.assertEqual(seen["before"], "default")
+
+    def test_one_replica_per_request(self):
+        def get_response(request):
+            middleware.process_view(request, TaskListView.as_view(), (), {})
+            seen.update(Task.objects.all().db for _ in range(20))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        with self.settings(TODOHAN_READ_REPLICAS=["replica", "replica2"]):
+            for _ in range(5):
+                seen = set()
+                middleware(RequestFactory().get("/"))
+                self.assertEqual(len(seen), 1)
+                self.assertIn(seen.pop(), ("replica", "replica2"))
+
+    def test_no_replicas_configured(self):
+        with self.settings(TODOHAN_READ_REPLICAS=[]):
+            seen, response = self.route(TaskListView.as_view(), write=True)
+        self.assertEqual(seen["before"], "default")
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StaticPipelineTests(SimpleTestCase):
+
+    def setUp(self):
+        source = self.enterContext(tempfile.TemporaryDirectory())
+        self.root = self.enterContext(tempfile.TemporaryDirectory())
+        os.makedirs(os.path.join(source, "css"))
+        with open(os.path.join(source, "css", "site.css"), "w") as f:
+            f.write("body { background: url('bg.svg'); }\n" * 200 + "/*# sourceMappingURL=site.css.map */\n")
+        with open(os.path.join(source, "css", "bg.svg"), "w") as f:
+            f.write("<svg xmlns='http://www.w3.org/2000/svg'></svg>")
+
+        self.enterContext(override_settings(
+            DEBUG=False,
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+            STORAGES={**settings.STORAGES, "staticfiles": {
+                "BACKEND": "todohan.storage.CompressedManifestStaticFilesStorage",
+            }},
+        ))
+        call_command("collectstatic", interactive=False, verbosity=0)
+        self.hashed = staticfiles_storage.stored_name("css/site.css")
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+
+    def get(self, name, **headers):
+        response = self.middleware(RequestFactory().get(f"/static/{name}", headers=headers))
+        # The handler would close it, and with it the file
+        self.addCleanup(response.close)
+        return response
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        self.assertRegex(self.hashed, r"^css/site\.[0-9a-f]{12}\.css$")
+        self.assertTrue(os.path.exists(os.path.join(self.root, self.hashed + ".gz")))
+        with open(os.path.join(self.root, self.hashed)) as f:
+            content = f.read()
+        self.assertIn(staticfiles_storage.stored_name("css/bg.svg").split("/")[-1], content)
+        # References to files that aren't shipped are left alone
+        self.assertIn("sourceMappingURL=site.css.map", content)
+
+    def test_serves_precompressed_hashed_file_forever(self):
+        response = self.get(self.hashed, accept_encoding="br, gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertIn(b"background", gzip.decompress(b"".join(response.streaming_content)))
+
+    def test_unhashed_names_and_identity_encoding(self):
+        response = self.get("css/site.css", accept_encoding="gzip;q=0")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.headers["Cache-Control"], STATIC_CACHE_CONTROL)
+        self.assertIsInstance(response, FileResponse)
+        self.assertNotIn("Content-Disposition", response.headers)
+        self.assertIn(b"background", b"".join(response.streaming_content))
+
+    def test_conditional_and_unknown_requests(self):
+        response = self.get(self.hashed, accept_encoding="gzip")
+        for conditional in ({"if_modified_since": response.headers["Last-Modified"]},
+                            {"if_none_match": response.headers["ETag"]}):
+            not_modified = self.get(self.hashed, accept_encoding="gzip", **conditional)
+            self.assertEqual(not_modified.status_code, 304)
+            for header in ("Cache-Control", "Vary", "ETag"):
+                self.assertEqual(not_modified.headers[header], response.headers[header])
+        # The identity copy is a different representation
+        self.assertEqual(self.get(self.hashed, if_none_match=response.headers["ETag"]).status_code, 200)
+        self.assertEqual(self.get("css/missing.css").status_code, 404)
+        self.assertEqual(self.get("../settings.py").status_code, 404)
+
+
+class SyncAPITests(TodohanTestCase):
+
+    def sync(self, token=None):
+        response = self.client.get("/api/sync/", {"since": token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_sync_then_only_changes(self):
+        data = self.sync()
+        self.assertTrue(data["full"])
+        self.assertFalse(data["more"])
+        self.assertEqual(len(data["tasks"]), 12)
+        self.assertEqual(data["counts"], {"tasks": 12, "notes": 12, "subtasks": 12})
+
+        # Nothing changed, nothing sent
+        data = self.sync(data["token"])
+        self.assertEqual((data["tasks"], data["notes"], data["subtasks"]), ([], [], []))
+
+        task = self.tasks[3]
+        task.title = "Changed"
+        task.save()
+        data = self.sync(data["token"])
+        self.assertFalse(data["full"])
+        self.assertEqual([t["title"] for t in data["tasks"]], ["Changed"])
+        self.assertEqual(data["notes"], [])
+
+    def test_rows_committed_after_a_sync_are_not_missed(self):
+        Task.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        token = self.sync()["token"]
+        # A slow transaction stamps its row, then commits after the sync above
+        late = self.tasks[5]
+        Task.objects.filter(pk=late.pk).update(title="Late", updated_at=timezone.now() - timedelta(seconds=30))
+        self.assertEqual([t["title"] for t in self.sync(token)["tasks"]], ["Late"])
+
+    def test_batches_resume_within_a_shared_timestamp(self):
+        Task.objects.update(updated_at=timezone.now())
+        seen, token = [], None
+        with mock.patch("todohan.api.SYNC_BATCH", 5):
+            while True:
+                data = self.sync(token)
+                seen += [t["id"] for t in data["tasks"]]
+                token = data["token"]
+                if not data["more"]:
+                    break
+        self.assertEqual(sorted(set(seen)), sorted(t.pk for t in self.tasks))
+
+    def test_rejects_bad_token_and_anonymous_clients(self):
+        self.assertEqual(self.client.get("/api/sync/", {"since": "bogus"}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/sync/").status_code, 401)
+
+    def test_service_worker_precaches_static_assets(self):
+        response = self.client.get("/serviceworker.js")
+        self.assertEqual(response["Content-Type"], "application/javascript")
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+        content = response.content.decode()
+        self.assertIn('"/static/css/kaiadmin.min.css"', content)
+        self.assertIn("const SYNC_URL = '/api/sync/';", content)
+
+
+class CounterTests(TodohanTestCase):
+
+    def assertCounts(self, task, subtasks, completed, notes):
+        task.refresh_from_db()
+        self.assertEqual(
+            (task.subtask_count, task.completed_subtask_count, task.note_count), (subtasks, completed, notes),
+        )
+
+    def test_counts_follow_creates_status_changes_and_deletes(self):
+        task = self.tasks[0]
+        self.assertCounts(task, 1, 0, 1)
+        subtask = SubTask.objects.create(parent_task=task, title="Extra", status="Completed")
+        Note.objects.create(task=task, content="Extra")
+        self.assertCounts(task, 2, 1, 2)
+        self.assertEqual(task.progress, 50)
+
+        subtask.status = "Pending"
+        subtask.save()
+        self.assertCounts(task, 2, 0, 2)
+
+        SubTask.objects.get(pk=subtask.pk).delete()
+        self.assertCounts(task, 1, 0, 2)
+
+    def test_moving_children_between_parents(self):
+        source, target = self.tasks[2], self.tasks[3]
+        subtask = SubTask.objects.get(parent_task=source)
+        subtask.parent_task = target
+        subtask.save()
+        self.assertCounts(source, 0, 0, 1)
+        self.assertCounts(target, 2, 1, 1)
+
+        task = Task.objects.get(pk=source.pk)
+        task.category = self.categories[0]
+        task.save()
+        self.assertEqual(
+            [c.task_count for c in Category.objects.order_by("pk")], [5, 4, 3],
+        )
+        task.delete()
+        self.assertEqual(Category.objects.get(pk=self.categories[0].pk).task_count, 4)
+
+    def test_counter_change_refreshes_task_list(self):
+        etag = self.client.get("/task_list").headers["ETag"]
+        SubTask.objects.create(parent_task=self.tasks[0], title="Extra")
+        response = self.client.get("/task_list", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "0/2 done")
+
+    def test_admin_change_page_links_children_with_counters(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        task = self.tasks[0]
+        Note.objects.create(task=task, content="Second note")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"/admin/todohan/task/{task.pk}/change/")
+        self.assertContains(response, "View all 2 notes")
+        self.assertContains(response, "View all 1 sub tasks")
+        self.assertFalse([q["sql"] for q in ctx if q["sql"].startswith("SELECT COUNT(*)")])
+
+    def test_batch_api_and_recount(self):
+        self.client.post("/api/subtasks/batch/", {
+            "create": [{"parent_task": self.tasks[0].pk, "title": "Batch", "status": "Completed"}],
+        }, content_type="application/json")
+        self.assertCounts(self.tasks[0], 2, 1, 1)
+
+        Task.objects.update(note_count=0)
+        out = StringIO()
+        call_command("recount", stdout=out)
+        self.assertIn("Tasks: 12 repaired.", out.getvalue())
+        self.assertCounts(self.tasks[0], 2, 1, 1)
+
+    def test_dashboard_top_lists_use_counters(self):
+        Category.objects.filter(pk=self.categories[1].pk).update(task_count=99)
+        with CaptureQueriesContext(connection) as ctx:
+            top = top_by_task_count(Category)
+        self.assertEqual(top[0]["task_count"], 99)
+        self.assertNotIn("JOIN", ctx[0]["sql"])
+
+
+class LookupCacheTests(TodohanTestCase):
+
+    def test_task_form_renders_and_cleans_without_queries(self):
+        TaskForm().as_p()
+        data = {
+            "title": "New", "description": "Text", "deadline": "2030-01-01 10:00", "status": "Pending",
+            "category": self.categories[1].pk, "priority": self.priorities[2].pk,
+        }
+        with self.assertNumQueries(0):
+            html = TaskForm().as_p()
+            form = TaskForm(data)
+            form.fields["category"].clean(data["category"])
+        self.assertIn("Category 2", html)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["category"], self.categories[1])
+        self.assertFalse(TaskForm({**data, "priority": 999}).is_valid())
+
+    def test_saving_a_lookup_row_reloads_every_copy(self):
+        before = get_lookup(Category)
+        category = Category.objects.get(pk=self.categories[0].pk)
+        category.name = "Renamed"
+        category.save()
+        self.assertNotEqual(get_lookup(Category).version, before.version)
+        self.assertEqual(get_lookup(Category).by_pk[category.pk].name, "Renamed")
+        self.assertContains(self.client.get("/task_list"), "Renamed")
+
+        Priority.objects.create(name="Urgent")
+        self.assertContains(self.client.get("/task_list/add"), "Urgent")
+
+    def test_task_list_and_admin_read_lookups_from_cache(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        for url in ["/task_list", "/", "/admin/todohan/task/?category__id__exact=2"]:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, "Priority 1")
+                # The dashboard's own COUNT/top-3 queries on the table are fine; loading rows is not
+                self.assertFalse([q["sql"] for q in ctx if '"todohan_category"."created_at"' in q["sql"]])
+
+
+class BulkActionTests(TodohanTestCase):
+
+    def test_confirmation_page_shows_counts_without_writing(self):
+        ids = [task.pk for task in self.tasks[:3]]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/task_list/bulk", {"ids": ids, "action": "delete"})
+        self.assertContains(response, "Delete <strong>3</strong> tasks?")
+        self.assertContains(response, "also deletes 3 subtasks and 3 notes")
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.assertFalse([q for q in ctx if not q["sql"].startswith("SELECT")])
+        self.assertEqual(Task.objects.count(), 12)
+
+        response = self.client.get("/task_list/bulk", {"ids": ids, "action": "status", "status": "Completed"})
+        self.assertContains(response, "2 of them will change")
+
+    def test_invalid_selection_changes_nothing(self):
+        response = self.client.post("/task_list/bulk", {"action": "delete"})
+        self.assertContains(response, "Select at least one row.")
+        response = self.client.post("/task_list/bulk", {"ids": [self.tasks[0].pk], "action": "priority"})
+        self.assertContains(response, "Choose the new value.")
+        self.assertEqual(Task.objects.count(), 12)
+
+    def test_update_is_one_statement_and_keeps_counters(self):
+        ids = [task.pk for task in self.tasks[:6]]
+        target = self.priorities[0]
+        before = Task.objects.get(pk=self.tasks[0].pk).updated_at
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/task_list/bulk", {"ids": ids, "action": "priority", "priority": target.pk})
+        self.assertRedirects(response, "/task_list", fetch_redirect_response=False)
+        self.assertEqual(len([q for q in ctx if q["sql"].startswith('UPDATE "todohan_task"')]), 1)
+        self.assertEqual(Task.objects.filter(pk__in=ids, priority=target).count(), 6)
+        # Rows that already had the value are left alone
+        self.assertEqual(Task.objects.get(pk=self.tasks[0].pk).updated_at, before)
+        self.assertEqual([p.task_count for p in Priority.objects.order_by("pk")], [8, 2, 2])
+
+        self.client.post("/subtasks/bulk/", {"ids": list(SubTask.objects.values_list("pk", flat=True)), "action": "status", "status": "Completed"})
+        self.assertEqual(set(Task.objects.values_list("completed_subtask_count", flat=True)), {1})
+
+    def test_delete_cascades_with_set_based_statements(self):
+        ids = [task.pk for task in self.tasks[:3]]
+        self.assertContains(self.client.get("/task_list?sort_by=title"), "Task 00")
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post("/task_list/bulk", {"ids": ids, "action": "delete"})
+        marks = [q for q in ctx if 'SET "deleted_at"' in q["sql"]]
+        self.assertEqual(len(marks), 3)
+        self.assertFalse([q for q in ctx if q["sql"].startswith("DELETE")])
+        self.assertFalse(Task.objects.filter(pk__in=ids).exists())
+        self.assertEqual(Note.objects.count(), 9)
+        self.assertEqual(SubTask.objects.count(), 9)
+        self.assertEqual([c.task_count for c in Category.objects.order_by("pk")], [3, 3, 3])
+        self.assertNotContains(self.client.get("/task_list?sort_by=title"), "Task 00")
+
+        subtask = SubTask.objects.get(parent_task=self.tasks[5])
+        self.client.post("/subtasks/bulk/", {"ids": [subtask.pk], "action": "delete"})
+        task = Task.objects.get(pk=self.tasks[5].pk)
+        self.assertEqual((task.subtask_count, task.completed_subtask_count), (0, 0))
+
+
+class SoftDeleteTests(TodohanTestCase):
+
+    def test_delete_view_marks_task_and_what_it_owns(self):
+        task = self.tasks[0]
+        response = self.client.post(f"/task_list/{task.pk}/delete")
+        self.assertRedirects(response, "/task_list", fetch_redirect_response=False)
+        self.assertFalse(Task.objects.filter(pk=task.pk).exists())
+        self.assertIsNotNone(Task.all_objects.get(pk=task.pk).deleted_at)
+        self.assertEqual(Note.all_objects.deleted().filter(task=task).count(), 1)
+        self.assertEqual(SubTask.all_objects.deleted().filter(parent_task=task).count(), 1)
+        self.assertEqual(Category.objects.get(pk=task.category_id).task_count, 3)
+        self.assertEqual(self.client.get(f"/task_list/{task.pk}").status_code, 404)
+        self.assertNotContains(self.client.get("/task_list?q=Task 00"), "Description 0<")
+
+        # Deleting it again for real must not take it off the counters twice
+        Task.all_objects.get(pk=task.pk).delete()
+        self.assertEqual(Category.objects.get(pk=task.category_id).task_count, 3)
+
+    def test_category_delete_cascades_to_tasks(self):
+        category = self.categories[0]
+        self.client.post(f"/categories/{category.pk}/delete/")
+        self.assertEqual(Task.objects.count(), 8)
+        self.assertEqual(Note.objects.count(), 8)
+        self.assertNotIn(category.pk, get_lookup(Category).by_pk)
+        self.assertEqual([p.task_count for p in Priority.objects.order_by("pk")], [0, 4, 4])
+        stats = self.client.get("/").context["stats"]
+        self.assertEqual((stats["total_tasks"], stats["total_categories"]), (8, 2))
+
+    def test_sync_sends_tombstones(self):
+        token = self.client.get("/api/sync/").json()["token"]
+        note = Note.objects.get(task=self.tasks[1])
+        self.client.post(f"/notes/{note.pk}/delete/")
+        data = self.client.get("/api/sync/", {"since": token}).json()
+        deleted = {row["id"] for row in data["notes"] if row["deleted_at"] is not None}
+        self.assertEqual(deleted, {note.pk})
+        self.assertEqual(data["counts"]["notes"], 11)
+
+    def test_purge_deleted_removes_old_rows_in_chunks(self):
+        self.client.post(f"/categories/{self.categories[1].pk}/delete/")
+        self.client.post(f"/task_list/{self.tasks[0].pk}/delete")
+        Task.all_objects.filter(pk=self.tasks[0].pk).update(deleted_at=timezone.now() - timedelta(days=30))
+
+        out = StringIO()
+        call_command("purge_deleted", stdout=out)
+        self.assertIn("Tasks: 1 purged.", out.getvalue())
+        self.assertFalse(Task.all_objects.filter(pk=self.tasks[0].pk).exists())
+        # Its note and subtask were marked at the same time as the task, so they go with it
+        self.assertFalse(Note.all_objects.filter(task_id=self.tasks[0].pk).exists())
+
+        call_command("purge_deleted", "--older-than", "0", "--chunk-size", "2", stdout=out)
+        self.assertEqual(Category.all_objects.count(), 2)
+        self.assertEqual(Task.all_objects.count(), Task.objects.count())
+        self.assertEqual(Note.all_objects.count(), 7)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM todohan_note_fts")
+            self.assertEqual(cursor.fetchone()[0], 7)
+
+
+class ExportTests(TodohanTestCase):
+
+    def test_ndjson_export_nests_children_and_follows_list_filters(self):
+        response = self.client.get("/task_list/export.ndjson", {"sort_by": "title"})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([r["title"] for r in records], sorted(f"Task {i:02}" for i in range(12)))
+        self.assertEqual(records[2]["category"], "Category 2")
+        self.assertEqual(records[2]["subtasks"][0]["status"], "Completed")
+        self.assertEqual(records[2]["notes"][0]["content"], "Note for task 2")
+
+        response = self.client.get("/task_list/export.ndjson", {"q": "Description 11"})
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 1)
+        self.assertEqual(self.client.get("/task_list/export.xml").status_code, 404)
+
+    def test_csv_export(self):
+        response = self.client.get("/task_list/export.csv")
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(json.loads(rows[0]["notes"])[0]["content"], Note.objects.get(task_id=rows[0]["id"]).content)
+        self.assertEqual(rows[0]["priority"], Task.objects.get(pk=rows[0]["id"]).priority.name)
+
+    def test_children_are_prefetched_per_chunk(self):
+        with CaptureQueriesContext(connection) as ctx:
+            records = list(task_records(export_queryset(Task.objects.order_by("id")), chunk_size=5))
+        self.assertEqual(len(records), 12)
+        # One task query, then notes and subtasks for each of the three chunks
+        self.assertEqual(len(ctx), 1 + 3 * 2)
+
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tasks.csv")
+            err = StringIO()
+            call_command("export_tasks", "--format", "csv", "-o", path, "-q", "Task 0", stderr=err)
+            with open(path, newline="") as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 10)
+        self.assertIn("Exported 10 tasks", err.getvalue())
+
+
+class ImportTests(TodohanTestCase):
+
+    def export(self, format):
+        response = self.client.get(f"/task_list/export.{format}", {"sort_by": "title"})
+        return b"".join(response.streaming_content).decode().splitlines(keepends=True)
+
+    def test_export_round_trips_through_import(self):
+        exports = {format: self.export(format) for format in ("ndjson", "csv")}
+        for format, lines in exports.items():
+            with self.subTest(format=format):
+                importer = import_tasks(lines, format, f"round-trip-{format}", chunk_size=5)
+                self.assertEqual(importer.report()["tasks_created"], 12)
+                self.assertTrue(importer.job.finished_at)
+        copies = Task.objects.filter(title="Task 02").order_by("id")
+        self.assertEqual(copies.count(), 3)
+        for task in copies:
+            self.assertEqual(task.category, self.categories[2])
+            self.assertEqual(task.note_set.get().content, "Note for task 2")
+            self.assertEqual((task.note_count, task.subtask_count, task.completed_subtask_count), (1, 1, 1))
+        self.assertEqual(Category.objects.get(pk=self.categories[2].pk).task_count, 12)
+
+    def test_missing_names_are_created_once_and_bad_rows_are_skipped(self):
+        row = {"description": "Imported", "deadline": "2026-01-01T09:00:00+00:00", "priority": "Priority 0"}
+        lines = [
+            json.dumps({**row, "title": "A", "status": "Pending", "category": "New"}) + "\n",
+            json.dumps({**row, "title": "B", "status": "Pending", "category": "New"}) + "\n",
+            json.dumps({**row, "title": "C", "status": "Someday", "category": "New", "priority": ""}) + "\n",
+            "not json\n",
+        ]
+        importer = import_tasks(lines, "ndjson", "names")
+        self.assertEqual(Category.objects.filter(name="New").get().task_count, 2)
+        report = importer.report()
+        self.assertEqual((report["tasks_created"], report["failed"]), (2, 2))
+        self.assertEqual([error["row"] for error in report["errors"]], [3, 4])
+        self.assertEqual(set(report["errors"][0]["errors"]), {"status", "priority"})
+
+    def test_resumes_after_last_committed_chunk(self):
+        lines = self.export("ndjson")
+        ImportJob.objects.create(key="resume", rows_done=10)
+        importer = import_tasks(lines, "ndjson", "resume", chunk_size=5)
+        self.assertEqual(importer.job.rows_done, 12)
+        self.assertEqual(importer.job.tasks_created, 2)
+        self.assertEqual(Task.objects.filter(title="Task 10").count(), 2)
+        # A finished job has nothing left to do until it is restarted
+        self.assertEqual(import_tasks(lines, "ndjson", "resume").job.tasks_created, 2)
+        self.assertEqual(import_tasks(lines, "ndjson", "resume", restart=True).job.tasks_created, 12)
+
+    def test_queries_per_chunk_do_not_grow_with_rows(self):
+        lines = self.export("ndjson")
+        with CaptureQueriesContext(connection) as ctx:
+            import_tasks(lines, "ndjson", "one-chunk")
+        with CaptureQueriesContext(connection) as ctx2:
+            import_tasks(lines * 4, "ndjson", "one-bigger-chunk")
+        self.assertEqual(len(ctx), len(ctx2))
+
+    def test_import_command_and_upload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tasks.csv")
+            call_command("export_tasks", "--format", "csv", "-o", path, stderr=StringIO())
+            out = StringIO()
+            call_command("import_tasks", path, "--chunk-size", "5", stdout=out, stderr=StringIO())
+            self.assertIn("Imported 12 tasks from 12 rows (0 failed).", out.getvalue())
+
+            with open(path, "rb") as f:
+                response = self.client.post("/api/tasks/import/", {"file": f, "job": "upload"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["tasks_created"], 12)
+        self.assertEqual(response.json()["job"], "upload")
+        self.assertEqual(Task.objects.count(), 36)
+
+
+class ArchiveTests(QueryBudgetTestMixin, TodohanTestCase):
+
+    def age(self, days, **filters):
+        Task.objects.filter(**filters).update(updated_at=timezone.now() - timedelta(days=days))
+
+    def test_moves_completed_tasks_with_their_children_in_chunks(self):
+        completed = [task for task in self.tasks if task.status == "Completed"]
+        self.age(100, status="Completed")
+        moved = []
+        self.assertEqual(archive_completed(timezone.now(), chunk_size=3, progress=moved.append), 4)
+        self.assertEqual(moved, [3, 4])
+
+        self.assertFalse(Task.all_objects.filter(status="Completed").exists())
+        self.assertFalse(Note.all_objects.filter(task_id__in=[task.pk for task in completed]).exists())
+        archived = ArchivedTask.objects.get(original_id=completed[0].pk)
+        self.assertEqual((archived.title, archived.category_id), (completed[0].title, completed[0].category_id))
+        self.assertEqual(archived.note_set.get().content, ArchivedNote.objects.get(task=archived).content)
+        self.assertEqual((archived.subtask_count, archived.subtask_set.count()), (1, 1))
+        # Every completed task was in Category 2
+        self.assertEqual(Category.objects.get(pk=self.categories[2].pk).task_count, 0)
+        self.assertEqual(Category.objects.get(pk=self.categories[0].pk).task_count, 4)
+
+    def test_command_only_archives_old_tasks(self):
+        self.age(100, pk__in=[self.tasks[2].pk, self.tasks[5].pk, self.tasks[0].pk])
+        out = StringIO()
+        call_command("archive_completed", "--older-than", "30", stdout=out, stderr=StringIO())
+        self.assertIn("Tasks: 2 archived.", out.getvalue())
+        self.assertEqual(
+            set(ArchivedTask.objects.values_list("original_id", flat=True)), {self.tasks[2].pk, self.tasks[5].pk}
+        )
+        self.assertTrue(Task.objects.filter(pk=self.tasks[0].pk).exists())
+
+    def test_archive_list_survives_purged_categories(self):
+        self.age(100, status="Completed")
+        archive_completed(timezone.now())
+        bulk.delete(Category, [self.categories[2].pk])
+        bulk.purge(Category, timezone.now() + timedelta(seconds=1))
+        self.assertFalse(Category.all_objects.filter(pk=self.categories[2].pk).exists())
+
+        # Name sorts are not offered for the archive; this one falls back to the deadline
+        response = self.client.get("/task_list/archive", {"sort_by": "category__name"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["tasks"]), 4)
+
+    def test_archive_list_joins_soft_deleted_categories(self):
+        self.age(100, status="Completed")
+        archive_completed(timezone.now())
+        bulk.delete(Category, [self.categories[2].pk])
+        bulk.delete(Priority, [self.priorities[2].pk])
+        response = self.assertWithinQueryBudget("/task_list/archive")
+        self.assertContains(response, "Category 2")
+        self.assertContains(response, "Priority 2")
+
+    def test_export_names_soft_deleted_categories_and_reimports(self):
+        self.age(100, status="Completed")
+        archive_completed(timezone.now())
+        bulk.delete(Category, [self.categories[2].pk])
+        bulk.delete(Priority, [self.priorities[2].pk])
+
+        response = self.client.get("/task_list/export.ndjson", {"archived": "1"})
+        lines = b"".join(response.streaming_content).decode().splitlines(keepends=True)
+        archived = [json.loads(line) for line in lines[-4:]]
+        self.assertEqual({(r["category"], r["priority"]) for r in archived}, {("Category 2", "Priority 2")})
+        importer = import_tasks(lines, "ndjson", "archived-reimport")
+        self.assertEqual((importer.job.tasks_created, importer.job.rows_failed), (len(lines), 0))
+
+    def test_archived_tasks_are_listed_and_exported_on_request(self):
+        self.age(100, status="Completed")
+        archive_completed(timezone.now())
+
+        response = self.assertWithinQueryBudget("/task_list/archive?q=Task 05")
+        self.assertEqual([task.original_id for task in response.context["tasks"]], [self.tasks[5].pk])
+        self.assertContains(response, "Category 2")
+        self.assertNotContains(self.client.get("/task_list"), "Task 05")
+
+        response = self.client.get("/task_list/export.ndjson")
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 8)
+        response = self.client.get("/task_list/export.ndjson", {"archived": "1"})
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(records), 12)
+        self.assertEqual(records[-1]["subtasks"][0]["status"], "Completed")
+        self.assertIn(self.tasks[5].pk, [record["id"] for record in records[8:]])
+
+
+class MetricsTests(TodohanTestCase):
+
+    def sample(self, text, name):
+        for line in text.splitlines():
+            if line.rsplit(" ", 1)[0] == name:
+                return float(line.rsplit(" ", 1)[1])
+        return 0.0
+
+    def scrape(self):
+        with override_settings(TODOHAN_METRICS_PUBLIC=True):
+            response = self.client.get("/metrics")
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_records_latency_sql_and_template_time_per_url_name(self):
+        labels = '{view="task-list",method="GET"}'
+        before = self.scrape()
+        self.client.get("/task_list")
+        self.client.get("/no-such-page")
+        after = self.scrape()
+
+        count = "todohan_request_duration_seconds_count" + labels
+        self.assertEqual(self.sample(after, count) - self.sample(before, count), 1)
+        self.assertIn('# TYPE todohan_request_duration_seconds histogram', after)
+        self.assertIn(f'todohan_request_duration_seconds_bucket{labels[:-1]},le="+Inf"}}', after)
+        queries = 'todohan_request_sql_queries_sum{view="task-list"}'
+        self.assertGreater(self.sample(after, queries), self.sample(before, queries))
+        self.assertIn('todohan_request_template_seconds_count{view="task-list"}', after)
+        self.assertIn('todohan_requests_total{view="unmatched",method="GET",status="404"}', after)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", (0.1, 1))
+        metrics.REGISTRY.remove(histogram)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+        self.assertEqual(histogram.render()[2:], [
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="1.0"} 2',
+            'test_seconds_bucket{le="+Inf"} 3',
+            "test_seconds_sum 5.55",
+            "test_seconds_count 3",
+        ])
+
+    def test_only_staff_or_the_token_get_metrics_by_default(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        with override_settings(TODOHAN_METRICS_TOKEN="s3cret"):
+            self.assertEqual(self.client.get("/metrics", headers={"authorization": "Bearer nope"}).status_code, 401)
+            response = self.client.get("/metrics", headers={"authorization": "Bearer s3cret"})
+            self.assertEqual(response.status_code, 200)
+        self.client.force_login(User.objects.create_user("staff", password="secret", is_staff=True))
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    @override_settings(TODOHAN_METRICS_PUBLIC=True)
+    def test_public_opt_out(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+
+@override_settings(TODOHAN_SLOW_QUERY_MS=0)
+class SlowQueryTests(TodohanTestCase):
+
+    def setUp(self):
+        super().setUp()
+        slowqueries.RECORDER.clear()
+
+    def test_normalize_folds_values(self):
+        self.assertEqual(
+            slowqueries.normalize("SELECT * FROM t WHERE id IN (%s, %s,\n %s) AND name = 'O''Brien' LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?",
+        )
+        self.assertEqual(slowqueries.fingerprint("SELECT 1"), slowqueries.fingerprint("SELECT  2"))
+
+    def test_records_view_and_plan_and_flags_full_scans(self):
+        # Two characters is too short for the trigram index, so this is an icontains scan
+        self.client.get("/task_list", {"q": "zz"})
+        entries = [e for e in slowqueries.RECORDER.snapshot() if '"todohan_task"' in e["sql"] and "LIKE" in e["sql"]]
+        self.assertTrue(entries)
+        self.assertEqual(entries[0]["view"], "task-list")
+        self.assertIn("todohan_task", entries[0]["plan"])
+        groups = slowqueries.group(entries)
+        self.assertEqual(len(groups), 1)
+        self.assertTrue(groups[0]["full_scan"])
+
+    def test_page_is_staff_only(self):
+        self.client.get("/task_list", {"q": "zz"})
+        self.assertEqual(self.client.get("/admin/slow-queries/").status_code, 302)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response = self.client.get("/admin/slow-queries/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Full table scan")
+        self.assertContains(response, "task-list")
+
+    def test_connection_opened_during_a_request_keeps_recording(self):
+        connection.close()
+        # The in-memory test database stays open, so replay what a reconnect mid-request does
+        connection.execute_wrappers.remove(slowqueries.RECORDER)
+        self.addCleanup(slowqueries.install, type(connection), connection)
+        with connection.execute_wrapper(metrics.QueryTimer()), connection.execute_wrapper(QueryCounter()):
+            slowqueries.install(type(connection), connection)
+        self.assertEqual(connection.execute_wrappers, [slowqueries.RECORDER])
+
+        self.client.get("/task_list", {"q": "zz"})
+        recorded = len(slowqueries.RECORDER.snapshot())
+        self.assertTrue(recorded)
+        self.client.get("/task_list", {"q": "yy"})
+        self.assertGreater(len(slowqueries.RECORDER.snapshot()), recorded)
+
+    @override_settings(TODOHAN_SLOW_QUERY_TABLE=True)
+    def test_saves_to_table_when_enabled(self):
+        self.client.get("/task_list", {"q": "zz"})
+        self.assertTrue(SlowQuery.objects.filter(view="task-list", sql__contains="LIKE").exists())
+        self.assertFalse(SlowQuery.objects.filter(sql__contains="todohan_slowquery").exists())
 
-# Create your tests here.
@@ -1,19 +1,58 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib import admin
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.templatetags.static import static
 from django.views.generic.list import ListView
-from todohan.models import Priority, Task, Note, SubTask, Category
-from django.views.generic.edit import CreateView, UpdateView, DeleteView
-from todohan.forms import TaskForm, NoteForm, SubTaskForm
-from django.urls import reverse_lazy
+from todohan.models import Priority, Task, Note, SubTask, Category, ArchivedTask
+from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormView
+from todohan.forms import TaskForm, NoteForm, SubTaskForm, TaskBulkActionForm, SubTaskBulkActionForm
+from django.urls import reverse, reverse_lazy
 from django.db.models import Q
 from django.utils import timezone
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db import models
-
-class HomePageView(LoginRequiredMixin, ListView):
+from django.utils.crypto import constant_time_compare
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.views.generic import TemplateView, View
+from django.db import models, connection, DatabaseError
+from todohan.stats import get_dashboard_stats
+from todohan.search import search, is_ranked, SEARCH_RANK
+from todohan.pagination import CursorPaginationMixin
+from todohan.caching import CachedPageMixin, page_cache_stats
+from todohan.conditional import ConditionalListMixin
+from todohan.lookups import LookupListMixin
+from todohan.db import get_sqlite_pragmas, read_sqlite_pragmas, pragmas_match
+from todohan import bulk, metrics, slowqueries
+from todohan.export import EXPORT_FORMATS, export_lines
+
+class SoftDeleteMixin:
+    """DeleteView that marks the row, and everything it owns, as deleted with a few UPDATEs.
+
+    The rows disappear at once; `manage.py purge_deleted` removes them later.
+    """
+
+    def form_valid(self, form):
+        success_url = self.get_success_url()
+        bulk.delete(self.model, [self.object.pk])
+        return HttpResponseRedirect(success_url)
+
+
+# query_budget is the number of SQL queries a GET may run, including the
+# session and user lookups, on a cold cache in a fresh process (no cached page,
+# lookups to load, FTS tables to look up); QueryBudgetMiddleware logs views
+# that go over it.
+
+class HomePageView(LoginRequiredMixin, CachedPageMixin, ConditionalListMixin, LookupListMixin, ListView):
     model = Task
     template_name = "home.html"
+    query_budget = 8
+    cache_models = (Priority, Category, Task, Note, SubTask)
+    conditional_related = ('priority', 'category')
+    lookup_related = ('priority', 'category')
     context_object_name = "recent_tasks"
-    paginate_by = 5
     ordering = ['-created_at']
 
     def get_queryset(self):
@@ -23,88 +62,178 @@ class HomePageView(LoginRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # General Stats
-        context["total_tasks"] = Task.objects.count()
-        context["completed_tasks"] = Task.objects.filter(status="Completed").count()
-        context["pending_tasks"] = Task.objects.exclude(status="Completed").count()
-        context["total_notes"] = Note.objects.count()
-        context["total_subtasks"] = SubTask.objects.count()
-        context["total_priorities"] = Priority.objects.count()
-        context["total_categories"] = Category.objects.count()
-
-        # Top 3 Priorities (by task count)
-        context["top_priorities"] = (
-            Priority.objects.annotate(task_count=models.Count("task"))
-            .order_by("-task_count")[:3]
-        )
-
-        # Top 3 Categories (by task count)
-        context["top_categories"] = (
-            Category.objects.annotate(task_count=models.Count("task"))
-            .order_by("-task_count")[:3]
-        )
+        # General stats and top 3 priorities/categories, served from the cached snapshot
+        context["stats"] = self.get_stats()
+        context.update(context["stats"])
 
         return context
 
-    
-class TaskListView(LoginRequiredMixin, ListView):
+    def get_stats(self):
+        return get_dashboard_stats()
+
+    def get_validator_items(self, context):
+        return super().get_validator_items(context) + [context["stats"]]
+
+
+TASK_SORT_FIELDS = ('deadline', 'title', 'status', 'category__name', 'priority__name')
+
+# An archived task's category or priority may have been purged since, and a
+# NULL sort value can't go into a page cursor
+ARCHIVE_SORT_FIELDS = ('deadline', 'title', 'status')
+
+
+def filter_tasks(qs, params, sort_fields=TASK_SORT_FIELDS):
+    """Apply the task list's ``q`` search and ``sort_by`` order; shared with the export."""
+    query = params.get('q')
+    sort_by = params.get('sort_by', 'deadline')
+    if query:
+        qs = search(qs, query, ['title', 'description'])
+    # Validate sort_by to prevent errors
+    if sort_by not in sort_fields:
+        sort_by = 'deadline'
+    # Category and priority come from the lookup cache, except where the cursor needs the joined value
+    if '__' in sort_by:
+        qs = qs.select_related(sort_by.split('__')[0])
+    # Rank search results by relevance unless a sort was picked explicitly
+    if is_ranked(qs) and not params.get('sort_by'):
+        return qs.order_by(SEARCH_RANK, 'status')
+    # Status ties go by deadline, the order task_status_deadline_idx already holds
+    return qs.order_by(sort_by, 'deadline' if sort_by == 'status' else 'status')
+
+
+class TaskListView(LoginRequiredMixin, CachedPageMixin, ConditionalListMixin, LookupListMixin, CursorPaginationMixin, ListView):
     model = Task
     context_object_name = 'tasks'
     template_name = 'task_list.html'
+    query_budget = 6
+    cache_models = (Task, Category, Priority)
+    conditional_related = ('category', 'priority')
+    lookup_related = ('category', 'priority')
     paginate_by = 6
     ordering = ['-created_at']
 
     def get_queryset(self):
-        qs = super().get_queryset()
-        query = self.request.GET.get('q')
-        sort_by = self.request.GET.get('sort_by', 'deadline')
-        if query:
-            qs = qs.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query)
-            )
-        # Validate sort_by to prevent errors
-        allowed_sort_fields = [
-            'deadline', 'title', 'status', 'category__name', 'priority__name'
-        ]
-        if sort_by not in allowed_sort_fields:
-            sort_by = 'deadline'
-        return qs.order_by(sort_by, 'status')
+        return filter_tasks(super().get_queryset(), self.request.GET)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['bulk_form'] = TaskBulkActionForm()
+        return context
+
+class ArchivedTaskListView(LoginRequiredMixin, CachedPageMixin, CursorPaginationMixin, ListView):
+    """Tasks moved out by `manage.py archive_completed`, searched and sorted like the task list."""
+    model = ArchivedTask
+    context_object_name = 'tasks'
+    template_name = 'task_archive.html'
+    query_budget = 3
+    cache_models = (ArchivedTask, Category, Priority)
+    paginate_by = 6
+
+    def get_queryset(self):
+        # Joined rather than taken from the lookup cache, which leaves out the
+        # soft-deleted categories and priorities old tasks often point at
+        queryset = super().get_queryset().select_related('category', 'priority')
+        return filter_tasks(queryset, self.request.GET, ARCHIVE_SORT_FIELDS)
+
+class TaskExportView(LoginRequiredMixin, View):
+    """Stream the tasks matching the task list's ``q``/``sort_by`` as CSV or NDJSON.
+
+    With ``archived=1`` the matching archived tasks follow the live ones.
+    """
+    query_budget = 3
+    replica_reads = True
+
+    def get(self, request, format):
+        if format not in EXPORT_FORMATS:
+            raise Http404("Unknown export format.")
+        queryset = filter_tasks(Task.objects.all(), request.GET)
+        archived = filter_tasks(ArchivedTask.objects.all(), request.GET) if request.GET.get('archived') else None
+        lines = export_lines(queryset, format, archived=archived)
+        response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[format][1])
+        response.headers['Content-Disposition'] = f'attachment; filename="tasks.{format}"'
+        return response
 
 class TaskCreateView(LoginRequiredMixin, CreateView):
     model = Task
     form_class = TaskForm
     template_name = 'task_form.html'
+    query_budget = 4
     success_url = reverse_lazy('task-list')
 
 class TaskUpdateView(LoginRequiredMixin, UpdateView):
     model = Task
     form_class = TaskForm
     template_name = 'task_form.html'
+    query_budget = 5
     success_url = reverse_lazy('task-list')
 
-class TaskDeleteView(LoginRequiredMixin, DeleteView):
+class TaskDeleteView(LoginRequiredMixin, SoftDeleteMixin, DeleteView):
     model = Task
     template_name = 'task_del.html'
+    query_budget = 3
+    success_url = reverse_lazy('task-list')
+
+
+class BulkActionView(LoginRequiredMixin, FormView):
+    """Confirm, then run, a bulk action picked on a list page.
+
+    The list page sends its selection with GET, so the cached list HTML needs
+    no CSRF token. This page shows how many rows the action affects and posts
+    the same selection back to run it as one set-based statement.
+    """
+    model = None
+    template_name = 'bulk_confirm.html'
+    query_budget = 3
+
+    def get_form_kwargs(self):
+        return {'data': self.request.POST if self.request.method == 'POST' else self.request.GET}
+
+    def get(self, request, *args, **kwargs):
+        return self.render_to_response(self.get_context_data())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        form = context['form']
+        context['verbose_name_plural'] = self.model._meta.verbose_name_plural
+        context['cancel_url'] = self.get_success_url()
+        if form.is_valid():
+            action = form.cleaned_data['action']
+            context['action'] = action
+            context['action_label'] = dict(form.actions)[action]
+            context['value'] = form.changes.get(action)
+            context['summary'] = bulk.summarize(self.model, form.cleaned_data['ids'], form.changes)
+        return context
+
+    def form_valid(self, form):
+        if form.changes:
+            bulk.update(self.model, form.cleaned_data['ids'], form.changes)
+        else:
+            bulk.delete(self.model, form.cleaned_data['ids'])
+        return super().form_valid(form)
+
+
+class TaskBulkActionView(BulkActionView):
+    model = Task
+    form_class = TaskBulkActionForm
     success_url = reverse_lazy('task-list')
 
-class NoteListView(LoginRequiredMixin, ListView):
+class NoteListView(LoginRequiredMixin, CachedPageMixin, ConditionalListMixin, CursorPaginationMixin, ListView):
     model = Note
     template_name = "note_list.html"
+    query_budget = 4
+    cache_models = (Note, Task)
+    conditional_related = ('task',)
     context_object_name = "notes"
     paginate_by = 6
     ordering = ['-created_at']
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        qs = super().get_queryset().select_related('task')
         query = self.request.GET.get('q')
         sort_by = self.request.GET.get('sort_by', 'created_at')
 
         if query:
-            qs = qs.filter(
-                Q(content__icontains=query) |
-                Q(task__title__icontains=query)
-            )
+            qs = search(qs, query, ['content', 'task__title'])
 
         allowed_sort_fields = [
             'created_at', 'updated_at', 'content', 'task__title'
@@ -112,12 +241,15 @@ class NoteListView(LoginRequiredMixin, ListView):
         if sort_by not in allowed_sort_fields:
             sort_by = 'created_at'
 
+        if is_ranked(qs) and not self.request.GET.get('sort_by'):
+            return qs.order_by(SEARCH_RANK)
         return qs.order_by(sort_by)
 
 class NoteCreateView(LoginRequiredMixin, CreateView):
     model = Note
     form_class = NoteForm
     template_name = "note_form.html"
+    query_budget = 3
     success_url = reverse_lazy("note-list")
     
 
@@ -125,30 +257,32 @@ class NoteUpdateView(LoginRequiredMixin, UpdateView):
     model = Note
     form_class = NoteForm
     template_name = "note_form.html"
+    query_budget = 4
     success_url = reverse_lazy("note-list")
 
-class NoteDeleteView(LoginRequiredMixin, DeleteView):
+class NoteDeleteView(LoginRequiredMixin, SoftDeleteMixin, DeleteView):
     model = Note
     template_name = "note_del.html"
+    query_budget = 3
     success_url = reverse_lazy("note-list")
 
-class SubTaskListView(LoginRequiredMixin, ListView):
+class SubTaskListView(LoginRequiredMixin, CachedPageMixin, ConditionalListMixin, CursorPaginationMixin, ListView):
     model = SubTask
     template_name = "subtask_list.html"
+    query_budget = 4
+    cache_models = (SubTask, Task)
+    conditional_related = ('parent_task',)
     context_object_name = "subtasks"
     paginate_by = 6
     ordering = ['-created_at']
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        qs = super().get_queryset().select_related('parent_task')
         query = self.request.GET.get('q')
         sort_by = self.request.GET.get('sort_by', 'created_at')
 
         if query:
-            qs = qs.filter(
-                Q(title__icontains=query) |
-                Q(parent_task__title__icontains=query)
-            )
+            qs = search(qs, query, ['title', 'parent_task__title'])
 
         allowed_sort_fields = [
             'created_at', 'updated_at', 'title', 'status', 'parent_task__title'
@@ -156,28 +290,45 @@ class SubTaskListView(LoginRequiredMixin, ListView):
         if sort_by not in allowed_sort_fields:
             sort_by = 'created_at'
 
+        if is_ranked(qs) and not self.request.GET.get('sort_by'):
+            return qs.order_by(SEARCH_RANK, 'status')
         return qs.order_by(sort_by, 'status')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['bulk_form'] = SubTaskBulkActionForm()
+        return context
+
 class SubTaskCreateView(LoginRequiredMixin, CreateView):
     model = SubTask
     form_class = SubTaskForm
     template_name = "subtask_form.html"
+    query_budget = 3
     success_url = reverse_lazy("subtask-list")
 
 class SubTaskUpdateView(LoginRequiredMixin, UpdateView):
     model = SubTask
     form_class = SubTaskForm
     template_name = "subtask_form.html"
+    query_budget = 4
     success_url = reverse_lazy("subtask-list")
 
-class SubTaskDeleteView(LoginRequiredMixin, DeleteView):
+class SubTaskDeleteView(LoginRequiredMixin, SoftDeleteMixin, DeleteView):
     model = SubTask
     template_name = "subtask_del.html"
+    query_budget = 3
     success_url = reverse_lazy("subtask-list")
 
-class CategoryListView(LoginRequiredMixin, ListView):
+class SubTaskBulkActionView(BulkActionView):
+    model = SubTask
+    form_class = SubTaskBulkActionForm
+    success_url = reverse_lazy("subtask-list")
+
+class CategoryListView(LoginRequiredMixin, CachedPageMixin, ConditionalListMixin, CursorPaginationMixin, ListView):
     model = Category
     template_name = "category_list.html"
+    query_budget = 4
+    cache_models = (Category,)
     context_object_name = "categories"
     paginate_by = 6
     ordering = ['-created_at']
@@ -201,6 +352,7 @@ class CategoryCreateView(LoginRequiredMixin, CreateView):
     model = Category
     fields = ['name']
     template_name = "category_form.html"
+    query_budget = 2
     success_url = reverse_lazy("category-list")
 
 
@@ -208,17 +360,21 @@ class CategoryUpdateView(LoginRequiredMixin, UpdateView):
     model = Category
     fields = ['name']
     template_name = "category_form.html"
+    query_budget = 3
     success_url = reverse_lazy("category-list")
 
 
-class CategoryDeleteView(LoginRequiredMixin, DeleteView):
+class CategoryDeleteView(LoginRequiredMixin, SoftDeleteMixin, DeleteView):
     model = Category
     template_name = "category_del.html"
+    query_budget = 3
     success_url = reverse_lazy("category-list")
 
-class PriorityListView(LoginRequiredMixin, ListView):
+class PriorityListView(LoginRequiredMixin, CachedPageMixin, ConditionalListMixin, CursorPaginationMixin, ListView):
     model = Priority
     template_name = "priority_list.html"
+    query_budget = 4
+    cache_models = (Priority,)
     context_object_name = "priorities"
     paginate_by = 6
     ordering = ['-created_at']
@@ -242,6 +398,7 @@ class PriorityCreateView(LoginRequiredMixin, CreateView):
     model = Priority
     fields = ['name']
     template_name = "priority_form.html"
+    query_budget = 2
     success_url = reverse_lazy("priority-list")
 
 
@@ -249,10 +406,88 @@ class PriorityUpdateView(LoginRequiredMixin, UpdateView):
     model = Priority
     fields = ['name']
     template_name = "priority_form.html"
+    query_budget = 3
     success_url = reverse_lazy("priority-list")
 
 
-class PriorityDeleteView(LoginRequiredMixin, DeleteView):
+class PriorityDeleteView(LoginRequiredMixin, SoftDeleteMixin, DeleteView):
     model = Priority
     template_name = "priority_del.html"
+    query_budget = 3
     success_url = reverse_lazy("priority-list")
+
+
+class PageCacheStatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(page_cache_stats())
+
+
+class SlowQueryView(TemplateView):
+    """Recorded slow queries grouped by fingerprint, costliest first; urls.py wraps it in admin_view."""
+    template_name = "admin/slow_queries.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(admin.site.each_context(self.request))
+        context["title"] = "Slow queries"
+        context["groups"] = slowqueries.group(slowqueries.get_entries())
+        context["threshold_ms"] = slowqueries.get_threshold() * 1000
+        context["from_table"] = slowqueries.table_enabled()
+        return context
+
+
+class DatabaseHealthView(View):
+    # Left public so load balancers and uptime checks can poll it
+
+    def get(self, request, *args, **kwargs):
+        sqlite = connection.vendor == "sqlite"
+        expected = get_sqlite_pragmas() if sqlite else {}
+        try:
+            pragmas = read_sqlite_pragmas(connection) if sqlite else {}
+        except DatabaseError:
+            return JsonResponse({"status": "unavailable"}, status=503)
+        return JsonResponse({
+            "status": "ok" if pragmas_match(expected, pragmas) else "degraded",
+            "vendor": connection.vendor,
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "pragmas": pragmas,
+            "expected": expected,
+        })
+
+
+class MetricsView(View):
+    # For staff, or scrapers sending TODOHAN_METRICS_TOKEN; TODOHAN_METRICS_PUBLIC opens it to anyone
+
+    def has_access(self, request):
+        if getattr(settings, "TODOHAN_METRICS_PUBLIC", False) or request.user.is_staff:
+            return True
+        token = getattr(settings, "TODOHAN_METRICS_TOKEN", None)
+        return bool(token) and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+    def get(self, request, *args, **kwargs):
+        if not self.has_access(request):
+            return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+class ServiceWorkerView(View):
+    """The PWA service worker, rendered with the current (hashed) static URLs."""
+
+    def get(self, request, *args, **kwargs):
+        precache = [reverse("offline")] + [static(name) for name in settings.TODOHAN_PRECACHE_ASSETS]
+        context = {
+            # A new release changes the hashed URLs, and with them the cache names
+            "version": hashlib.md5(json.dumps(precache).encode()).hexdigest()[:12],
+            "precache": json.dumps(precache),
+            "static_url": settings.STATIC_URL,
+            "offline_url": reverse("offline"),
+            "sync_url": reverse("api-sync"),
+        }
+        response = HttpResponse(render_to_string("serviceworker.js", context), content_type="application/javascript")
+        # Browsers must re-check the worker itself on every visit to notice a release
+        response.headers["Cache-Control"] = "no-cache"
+        return response